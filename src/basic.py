@@ -405,18 +405,19 @@ def _make_multivalue_callback(frame):
         frame.show_dialog(dialog)
     return do_it
 
-logging.basicConfig(filename="tui.log", level=logging.DEBUG)
-
-# This isn't working, not sure why. Maybe there's a better way to deal
-# with screen resize...
-while True:
-    try:
-        screen = Screen.open(unicode_aware=True)
-        logger.debug("========= Created screen with dimensions %s", screen.dimensions)
-        demo(screen)
-        sys.exit(0)
-    except ResizeScreenError:
-        screen.close()
-    except StopApplication:
-        screen.close()
-        sys.exit(0)
+if __name__ == "__main__":
+    logging.basicConfig(filename="tui.log", level=logging.DEBUG)
+
+    # This isn't working, not sure why. Maybe there's a better way to deal
+    # with screen resize...
+    while True:
+        try:
+            screen = Screen.open(unicode_aware=True)
+            logger.debug("========= Created screen with dimensions %s", screen.dimensions)
+            demo(screen)
+            sys.exit(0)
+        except ResizeScreenError:
+            screen.close()
+        except StopApplication:
+            screen.close()
+            sys.exit(0)
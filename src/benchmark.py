@@ -0,0 +1,352 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Layout and rendering benchmarks.
+
+Builds synthetic sheet trees of different shapes and sizes, runs them
+in a frame on a headless screen and times layout, rendering, focus
+cycling and mouse hit-testing. The results are written as JSON so
+runs on different commits can be compared:
+
+    python src/benchmark.py --output before.json
+    ... make changes ...
+    python src/benchmark.py --output after.json --compare before.json
+
+Trees are built deterministically so the same sizes always produce
+the same trees.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from geometry.points import Point
+
+from frames.frame import Frame
+from frames.headless import HeadlessScreen
+from sheets.toplevel import TopLevelSheet
+from sheets.borderlayout import BorderLayout
+from sheets.buttons import Button
+from sheets.boxlayout import HorizontalLayout, VerticalLayout
+from sheets.label import Label
+from controls.listcontrol import ListControl
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+SHAPES = ["wide", "deep"]
+SIZES = [10, 1000, 10000]
+CASES = ["lay_out_frame", "render", "render_invalidated_sheets",
+         "cycle_focus", "hit_test"]
+
+#####                                                   TREES #
+
+def _count_sheets(sheet):
+    return 1 + sum(_count_sheets(child) for child in sheet._children)
+
+
+def _make_leaf(index):
+    # widgets are picked in rotation so every tree has a similar mix
+    kind = index % 4
+    if kind == 0:
+        return Label("Label {}".format(index))
+    if kind == 1:
+        return Button(label="B{}".format(index), decorated=index % 8 == 1)
+    if kind == 2:
+        return ListControl(options=["Option {}".format(n) for n in range(5)])
+    border = BorderLayout(title="L{}".format(index), style="single")
+    border.add_child(Label("Bordered {}".format(index)))
+    return border
+
+
+def _fill_layout(layout, budget, index):
+    # add widgets to layout until it holds about budget sheets
+    # including itself; always adds at least one. Returns the number
+    # of sheets added and the next widget index.
+    count = 0
+    while True:
+        leaf = _make_leaf(index)
+        leaf_count = _count_sheets(leaf)
+        if count > 0 and 1+count+leaf_count > budget:
+            return (count, index)
+        layout.add_child(leaf)
+        count += leaf_count
+        index += 1
+
+
+def make_wide_tree(size):
+    """Return a vertical layout of rows of widgets with about size sheets."""
+    rows = VerticalLayout([])
+    count = 1
+    index = 0
+    while count < size:
+        row = HorizontalLayout([])
+        rows.add_child(row)
+        # up to about 8 widgets per row
+        (added, index) = _fill_layout(row, min(size-count, 30), index)
+        count += 1 + added
+    return rows
+
+
+def make_deep_tree(size):
+    """Return nested box and border layouts with about size sheets."""
+    index = [0]
+
+    def _make_node(budget, depth):
+        # budget is the number of sheets this subtree should contain
+        if budget <= 16:
+            layout = HorizontalLayout([])
+            (added, index[0]) = _fill_layout(layout, budget, index[0])
+            return (layout, 1+added)
+        layout = VerticalLayout([]) if depth % 2 == 0 else HorizontalLayout([])
+        count = 1
+        root = layout
+        if depth % 3 == 2:
+            root = BorderLayout(style="single")
+            root.add_child(layout)
+            count += 1
+        remaining = budget - count
+        for budget in [remaining // 2, remaining - remaining // 2]:
+            (child, child_count) = _make_node(budget, depth+1)
+            layout.add_child(child)
+            count += child_count
+        return (root, count)
+
+    (root, _) = _make_node(size, 0)
+    return root
+
+
+def make_frame(shape, size, width=200, height=60):
+    """Return a laid out and rendered frame holding a synthetic tree."""
+    screen = HeadlessScreen(width=width, height=height)
+    frame = Frame(screen)
+    top_level = TopLevelSheet()
+    tree = make_wide_tree(size) if shape == "wide" else make_deep_tree(size)
+    top_level.add_child(tree)
+    top_level.graft(frame)
+    frame.lay_out_frame()
+    frame.render()
+    return frame
+
+#####                                                   CASES #
+
+def _leaves(sheet):
+    if not sheet._children:
+        return [sheet]
+    return [leaf for child in sheet._children for leaf in _leaves(child)]
+
+
+def _bench_lay_out_frame(frame):
+    top_level = frame.top_level_sheet()
+
+    def _run():
+        # forget the previous allocation so the whole tree is laid
+        # out, as it is when the screen size changes
+        top_level._region = None
+        frame.lay_out_frame()
+    return _run
+
+
+def _bench_render(frame):
+    return frame.render
+
+
+def _bench_render_invalidated_sheets(frame):
+    # a handful of widgets spread through the tree change each frame
+    leaves = _leaves(frame.top_level_sheet())
+    step = max(len(leaves) // 10, 1)
+    changed = leaves[::step]
+
+    def _run():
+        for leaf in changed:
+            leaf.invalidate()
+        frame.render_invalidated_sheets()
+    return _run
+
+
+def _bench_cycle_focus(frame):
+    # tab doesn't wrap; start each run from the first focus candidate
+    # and go back to it at the last so every step moves the focus
+    first = frame.top_level_sheet().find_focus_candidate()
+
+    def _run():
+        frame.set_focus(first)
+        for _ in range(10):
+            if not frame.cycle_focus_forward():
+                frame.set_focus(first)
+    return _run
+
+
+def _bench_hit_test(frame):
+    top_level = frame.top_level_sheet()
+    screen = frame._screen
+    points = [Point(x, y)
+              for y in range(0, screen.height, 3)
+              for x in range(0, screen.width, 7)]
+
+    def _run():
+        for point in points:
+            top_level.sheet_at(point.point_x(), point.point_y())
+    return _run
+
+
+_CASE_FUNCTIONS = {
+    "lay_out_frame": _bench_lay_out_frame,
+    "render": _bench_render,
+    "render_invalidated_sheets": _bench_render_invalidated_sheets,
+    "cycle_focus": _bench_cycle_focus,
+    "hit_test": _bench_hit_test,
+}
+
+_CASE_OPERATIONS = {
+    "lay_out_frame": 1,
+    "render": 1,
+    "render_invalidated_sheets": 1,
+    "cycle_focus": 10,
+    "hit_test": None,
+}
+
+def time_case(frame, case, repeat, min_time=0.2):
+    """Return timings in seconds for one case run on frame.
+
+    Each sample runs the case enough times to take about min_time /
+    repeat seconds and records the mean.
+    """
+    run = _CASE_FUNCTIONS[case](frame)
+    run()
+    # calibrate so quick cases aren't dominated by timer resolution
+    start = time.perf_counter()
+    run()
+    once = max(time.perf_counter()-start, 1e-7)
+    loops = max(1, int(min_time / repeat / once))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter()-start) / loops)
+    return samples
+
+
+def run_benchmarks(shapes=SHAPES, sizes=SIZES, cases=CASES, repeat=5):
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            frame = make_frame(shape, size)
+            sheets = _count_sheets(frame.top_level_sheet())
+            for case in cases:
+                samples = time_case(frame, case, repeat)
+                operations = _CASE_OPERATIONS[case]
+                if operations is None:
+                    operations = len(range(0, frame._screen.height, 3)) \
+                        * len(range(0, frame._screen.width, 7))
+                results.append({
+                    "case": case,
+                    "shape": shape,
+                    "size": size,
+                    "sheets": sheets,
+                    "operations": operations,
+                    "min": min(samples),
+                    "median": statistics.median(samples),
+                    "mean": statistics.mean(samples),
+                })
+                logger.info("%s %s %s: %s", shape, size, case, min(samples))
+    return results
+
+#####                                                   REPORT #
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(results):
+    return {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "unit": "seconds",
+        "results": results,
+    }
+
+
+def _result_key(result):
+    return (result["case"], result["shape"], result["size"])
+
+
+def compare_reports(old, new):
+    """Return lines comparing the minimum times of two reports."""
+    old_results = {_result_key(result): result for result in old["results"]}
+    lines = []
+    for result in new["results"]:
+        previous = old_results.get(_result_key(result))
+        if previous is None:
+            continue
+        ratio = previous["min"] / result["min"] if result["min"] > 0 else float("inf")
+        lines.append("{:<26} {:<5} {:>6}  {:>11.6f} -> {:>11.6f}  x{:.2f}".format(
+            result["case"], result["shape"], result["size"],
+            previous["min"], result["min"], ratio))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="tui89 layout and render benchmarks")
+    parser.add_argument("--shapes", default=",".join(SHAPES),
+                        help="comma separated tree shapes (default: %(default)s)")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES),
+                        help="comma separated numbers of sheets (default: %(default)s)")
+    parser.add_argument("--cases", default=",".join(CASES),
+                        help="comma separated cases (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="samples per case (default: %(default)s)")
+    parser.add_argument("--output", help="file to write the JSON report to; default stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+
+    # large trees nest deeply
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    results = run_benchmarks(shapes=args.shapes.split(","),
+                             sizes=[int(size) for size in args.sizes.split(",")],
+                             cases=args.cases.split(","),
+                             repeat=args.repeat)
+    report = make_report(results)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as previous:
+            for line in compare_reports(json.load(previous), report):
+                print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,7 @@ from sheets.separators import VerticalSeparator
 from frames.commands import find_command
 from sheets.textentry import TextEntry
 from controls.listcontrol import ListControl
+from controls.optionsource import option_source
 from sheets.dialog import MultivalueDialog
 
 from logging import getLogger
@@ -57,9 +58,8 @@ class ComboBox(Sheet):
     def __init__(self,
                  options=None):
         super().__init__()
-        if options is None:
-            options = []
-        self._options = options
+        # list or OptionSource
+        self._options = option_source(options)
         self._children = []
         self._entry = TextEntry(text=ComboBox.default_text, owner=self)
         self.add_child(self._entry)
@@ -88,7 +88,8 @@ class ComboBox(Sheet):
         return value if value != ComboBox.default_text else None
 
     def set_options(self, options):
-        self._options = options
+        self._options = option_source(options)
+        self.invalidate_layout()
         self.invalidate()
 
     #####                                                   LAYOUT #
@@ -106,7 +107,7 @@ class ComboBox(Sheet):
         self._entry.allocate_space(Region(l, t, r-3, b))
         self._drop_label.allocate_space(Region(l, t, l+2, t+1))
 
-    def compose_space(self):
+    def _compose_space(self):
         label_sr = self._entry.compose_space()
         # +2 is for the |v| "button", +1 is for the drop shadow
         return SpaceReq(label_sr.x_min()+2+1, label_sr.x_preferred()+2+1, FILL,
@@ -114,6 +115,9 @@ class ComboBox(Sheet):
 
     #####                                                   EVENT HANDLING #
 
+    def command_table(self):
+        return "combobox"
+
     def handle_key_event(self, kevent):
 
         # FIXME: if the combobox value is not the default value when
@@ -131,7 +135,7 @@ class ComboBox(Sheet):
                                      Screen.KEY_DOWN]
 
         if kevent.key_code not in ignored_combobox_keys:
-            command = find_command(kevent, command_table="combobox")
+            command = find_command(kevent, command_table=self.command_table())
             if command is not None:
                 result = command.apply(self)
                 if result:
@@ -209,6 +213,9 @@ class ComboBox(Sheet):
     def is_widget_focus(self, widget):
         return self.is_focus() and widget == self._widget_focus
 
+    def focus_children(self):
+        return []
+
     def find_focus_candidate(self, from_end=False):
         # Do not descend into children; we know the control accepts
         # the focus and deals with key events on behalf of its
@@ -279,7 +286,8 @@ class ComboBox(Sheet):
             self.frame().dialog_quit()
         # If the list of entries does not contain the current value of
         # the text entry, add the value in the text entry to the list.
-        if self._entry._text not in self._options:
+        # Sources that aren't held locally can't be added to.
+        if hasattr(self._options, "insert") and self._entry._text not in self._options:
             # add new entries to the start so they're easier to find
             self._options.insert(0, self._entry._text)
         # FIXME: is some event needed here? value-changed?
@@ -28,6 +28,7 @@ from geometry.transforms import Transform
 from geometry.points import Point
 
 from mixins.valuemixin import ValueMixin
+from controls.optionsource import option_source
 
 from logging import getLogger
 
@@ -36,21 +37,18 @@ logger = getLogger(__name__)
 # A control that wraps a list layout and vertical bar in a scroller.
 class ListControl(Sheet, ValueMixin):
 
-    def __init__(self, options=[], owner=None):
+    def __init__(self, options=None, owner=None):
         super().__init__(owner=owner)
 
-        self._options = options
+        # list or OptionSource
+        self._options = option_source(options)
         self._layout = HorizontalLayout([1, (1, "char")], owner=self)
         self.add_child(self._layout)
 
         self._listbox = ListLayout(owner=self)
-        if len(options) > 0:
-            self._fab_listbox_children(options)
         self._vbar = Scrollbar(orientation="vertical")
 
-        self._viewport = Viewport(self._listbox, vertical_bar=self._vbar, owner=self)
-
-        self._layout.add_child(self._viewport)
+        self._layout.add_child(self._make_list_pane(self._options))
         self._layout.add_child(self._vbar)
 
         # controls contain and manage embedded child widgets; record
@@ -84,6 +82,14 @@ class ListControl(Sheet, ValueMixin):
         else:
             return "ListControl({} entries)".format(num_children)
 
+    def _make_list_pane(self, options):
+        # returns the sheet that shows the list entries next to the
+        # scroll bar
+        if len(options) > 0:
+            self._fab_listbox_children(options)
+        self._viewport = Viewport(self._listbox, vertical_bar=self._vbar, owner=self)
+        return self._viewport
+
     def _fab_listbox_children(self, options):
         for opt in options:
             # fixme: there's no reason these items should be
@@ -118,12 +124,12 @@ class ListControl(Sheet, ValueMixin):
         # "filter" method and then add only new ones?
         self._listbox.clear_children()
         self._fab_listbox_children(updated_elts)
-        # does invalidate relayout as well as redraw? NOPE. Need a
-        # method that redoes the space calc, lays out children, and
-        # renders them ("relayout"?)
-        self._layout.allocate_space(self._region)
-        self._listbox.layout()
-        # fixme: update scrollbars; reduce size of containing dialog
+        # lay out the part of the control affected by the change to
+        # the list's size
+        self._listbox.relayout()
+        # the viewport picks up the list's new extents when it's laid
+        # out again.
+        # fixme: reduce size of containing dialog
         # if list has shrunk to a point where there's empty space.
         self.invalidate()
 
@@ -138,7 +144,7 @@ class ListControl(Sheet, ValueMixin):
         for child in self._children:
             child.allocate_space(allocation)
 
-    def compose_space(self):
+    def _compose_space(self):
         # default size for list control is 10x10
         for c in self._children:
             # single child.
@@ -163,6 +169,9 @@ class ListControl(Sheet, ValueMixin):
             result = True
         return result
 
+    def command_table(self):
+        return "listcontrol"
+
     def handle_key_event(self, event):
 
         logger.debug("   handle_key_event entered for event %s", event)
@@ -177,7 +186,7 @@ class ListControl(Sheet, ValueMixin):
             if result:
                 return True
         # Try to handle the event ourselves
-        command = find_command(event, command_table="listcontrol")
+        command = find_command(event, command_table=self.command_table())
         if command is not None:
             result = command.apply(self)
             if result:
@@ -362,6 +371,10 @@ class ListControl(Sheet, ValueMixin):
         # logger.debug("RESULT IS {}", result)
         # return result
 
+    # find focus within FRAME
+    def focus_children(self):
+        return []
+
     # find focus within FRAME
     def find_focus_candidate(self, from_end=False):
         # Don't descend into children; return self if self accepts
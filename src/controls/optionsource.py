@@ -0,0 +1,294 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class OptionSource():
+    """Options shown by list controls, combo boxes and option boxes.
+
+    Sources provide:
+
+      + len(source) - the number of options;
+
+      + fetch(start, stop) - list of the options from index start up
+      to (not including) stop;
+
+      + index_of(option) - index of the first occurrence of option, or
+      None if it isn't present. "option in source" uses this;
+
+      + fetch_async(start, stop, callback) - arranges for
+      callback(start, options) to be invoked once the options are
+      available. Sources that can fetch without blocking do so
+      immediately.
+
+    Iterating over a source yields all its options.
+    """
+    # number of options fetched at a time when iterating
+    page_size = 64
+
+    def __len__(self):
+        raise NotImplementedError("option sources must implement __len__")
+
+    def fetch(self, start, stop):
+        raise NotImplementedError("option sources must implement fetch")
+
+    def fetch_async(self, start, stop, callback):
+        callback(start, self.fetch(start, stop))
+
+    def index_of(self, option):
+        # override if the source can do better than a linear search
+        index = 0
+        for candidate in self:
+            if candidate == option:
+                return index
+            index += 1
+        return None
+
+    def __contains__(self, option):
+        return self.index_of(option) is not None
+
+    def __iter__(self):
+        start = 0
+        length = len(self)
+        while start < length:
+            for option in self.fetch(start, min(start+self.page_size, length)):
+                yield option
+            start += self.page_size
+
+
+class SequenceSource(OptionSource):
+    """Options held in a list or other sequence.
+
+    The sequence isn't copied so it mustn't be changed once it's
+    handed to the source; use "insert" to add options. Membership
+    tests and index lookups use indexes built the first time they're
+    needed, so they don't scan the list. The indexes are dropped if
+    the length of the sequence is found to have changed anyway.
+    """
+    def __init__(self, sequence):
+        # copied the first time an option is inserted so the caller's
+        # sequence is never changed
+        self._options = sequence
+        self._copied = False
+        # option -> number of occurrences
+        self._counts = None
+        # option -> index of first occurrence
+        self._positions = None
+        # length of the options when the indexes were built
+        self._indexed_length = None
+
+    def __repr__(self):
+        return "SequenceSource({} options)".format(len(self._options))
+
+    def __len__(self):
+        return len(self._options)
+
+    def __iter__(self):
+        return iter(self._options)
+
+    def fetch(self, start, stop):
+        return self._options[start:stop]
+
+    def _check_indexes(self):
+        length = len(self._options)
+        if self._indexed_length != length:
+            self._counts = None
+            self._positions = None
+            self._indexed_length = length
+
+    def index_of(self, option):
+        self._check_indexes()
+        if self._positions is None:
+            self._positions = dict()
+            for (index, candidate) in enumerate(self._options):
+                self._positions.setdefault(candidate, index)
+        return self._positions.get(option)
+
+    def __contains__(self, option):
+        self._check_indexes()
+        if self._counts is None:
+            self._counts = dict()
+            for candidate in self._options:
+                self._counts[candidate] = self._counts.get(candidate, 0) + 1
+        return option in self._counts
+
+    def insert(self, index, option):
+        self._check_indexes()
+        if not self._copied:
+            self._options = list(self._options)
+            self._copied = True
+        self._options.insert(index, option)
+        self._indexed_length += 1
+        if self._counts is not None:
+            self._counts[option] = self._counts.get(option, 0) + 1
+        # positions after the insertion point have all moved
+        self._positions = None
+
+
+class IteratorSource(SequenceSource):
+    """Options produced by an iterator, e.g. a generator or a file.
+
+    Options are only read from the iterator when they're asked for.
+    Asking for the length reads all of them.
+    """
+    def __init__(self, iterable):
+        super().__init__([])
+        self._copied = True
+        self._iterator = iter(iterable)
+
+    def __repr__(self):
+        state = "exhausted" if self._iterator is None else "partial"
+        return "IteratorSource({} options, {})".format(len(self._options), state)
+
+    def _read_to(self, stop):
+        # read options from the iterator until there are at least
+        # "stop" of them; None reads them all
+        while self._iterator is not None \
+              and (stop is None or len(self._options) < stop):
+            try:
+                option = next(self._iterator)
+            except StopIteration:
+                self._iterator = None
+                return
+            # keep the indexes up to date if they've been built
+            if self._counts is not None:
+                self._counts[option] = self._counts.get(option, 0) + 1
+            if self._positions is not None:
+                self._positions.setdefault(option, len(self._options))
+            self._options.append(option)
+            if self._indexed_length is not None:
+                self._indexed_length += 1
+
+    def __len__(self):
+        self._read_to(None)
+        return len(self._options)
+
+    def __iter__(self):
+        index = 0
+        while True:
+            self._read_to(index+1)
+            if index >= len(self._options):
+                return
+            yield self._options[index]
+            index += 1
+
+    def fetch(self, start, stop):
+        self._read_to(stop)
+        return self._options[start:stop]
+
+    def index_of(self, option):
+        index = super().index_of(option)
+        # not seen yet; keep reading until it turns up
+        while index is None and self._iterator is not None:
+            self._read_to(len(self._options)+self.page_size)
+            index = self._positions.get(option)
+        return index
+
+    def __contains__(self, option):
+        return self.index_of(option) is not None
+
+
+class PagedSource(OptionSource):
+    """Options fetched a page at a time from some backend.
+
+    "fetch_page(start, stop)" returns a list of the options in that
+    range. Pages are cached once fetched. If "fetch_page_async" is
+    supplied it is called as fetch_page_async(start, stop, callback)
+    and must arrange for callback(start, options) to be called when
+    the options arrive; it's used by "fetch_async" for pages that
+    aren't cached.
+    """
+    def __init__(self, fetch_page, length, page_size=64, fetch_page_async=None):
+        self._fetch_page = fetch_page
+        self._fetch_page_async = fetch_page_async
+        self._length = length
+        self.page_size = page_size
+        # page number -> list of options
+        self._pages = dict()
+
+    def __repr__(self):
+        return "PagedSource({} options, {} pages cached)".format(self._length,
+                                                                  len(self._pages))
+
+    def __len__(self):
+        return self._length
+
+    def _page_range(self, start, stop):
+        return range(start // self.page_size, (max(stop, start+1)-1) // self.page_size + 1)
+
+    def _page_bounds(self, page):
+        start = page * self.page_size
+        return (start, min(start+self.page_size, self._length))
+
+    def _from_pages(self, start, stop):
+        options = []
+        for page in self._page_range(start, stop):
+            (page_start, _) = self._page_bounds(page)
+            page_options = self._pages[page]
+            options.extend(page_options[max(start-page_start, 0):stop-page_start])
+        return options
+
+    def fetch(self, start, stop):
+        stop = min(stop, self._length)
+        if start >= stop:
+            return []
+        for page in self._page_range(start, stop):
+            if page not in self._pages:
+                self._pages[page] = self._fetch_page(*self._page_bounds(page))
+        return self._from_pages(start, stop)
+
+    def fetch_async(self, start, stop, callback):
+        stop = min(stop, self._length)
+        missing = [page for page in self._page_range(start, stop)
+                   if page not in self._pages] if start < stop else []
+        if not missing or self._fetch_page_async is None:
+            callback(start, self.fetch(start, stop))
+            return
+        outstanding = set(missing)
+
+        def _page_arrived(page_start, options):
+            page = page_start // self.page_size
+            self._pages[page] = options
+            outstanding.discard(page)
+            if not outstanding:
+                callback(start, self._from_pages(start, stop))
+
+        for page in missing:
+            (page_start, page_stop) = self._page_bounds(page)
+            self._fetch_page_async(page_start, page_stop, _page_arrived)
+
+
+def option_source(options, length=None):
+    """Return an OptionSource for options.
+
+    options may be an OptionSource, a list or other sequence, any
+    other iterable, or a callable taking an index in which case length
+    must be supplied.
+    """
+    if options is None:
+        return SequenceSource([])
+    if isinstance(options, OptionSource):
+        return options
+    if callable(options):
+        if length is None:
+            raise RuntimeError("option callable needs a length", options)
+        return PagedSource(lambda start, stop: [options(index) for index in range(start, stop)],
+                           length)
+    if hasattr(options, "__getitem__") and hasattr(options, "__len__"):
+        return SequenceSource(options)
+    return IteratorSource(options)
@@ -0,0 +1,264 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from controls.listcontrol import ListControl
+from sheets.label import ValueLabel
+from controls.optionsource import option_source
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class _VirtualRow(ValueLabel):
+    # pooled row of a VirtualListControl. Rows show different entries
+    # as the list scrolls so they mustn't keep the frame focus
+    # themselves; clicking one focuses its entry through the control.
+    def note_focus_in(self):
+        super().note_focus_in()
+        if self.frame().focus() is self:
+            self._owner._note_row_focused(self)
+
+
+class VirtualListControl(ListControl):
+    """List control that only creates sheets for the visible rows.
+
+    Entries come from a data source that is an OptionSource, a
+    sequence or a callable taking an index. A callable must be given
+    the number of entries as "length".
+
+    The control keeps one ValueLabel per visible line. When the list
+    is scrolled the same labels are reused to show different entries
+    so the cost of drawing, laying out and navigating the list doesn't
+    depend on the number of entries.
+    """
+    def __init__(self, data=None, length=None, owner=None):
+        # index of the entry shown in the first row
+        self._top = 0
+        # index of the entry with the focus within the control
+        self._focus_index = None
+        super().__init__(options=option_source(data, length), owner=owner)
+
+    def __repr__(self):
+        if self._value is not None:
+            return "VirtualListControl(value='{}', {} entries)".format(self._value,
+                                                                       self.item_count())
+        else:
+            return "VirtualListControl({} entries)".format(self.item_count())
+
+    def _make_list_pane(self, options):
+        # no viewport; the rows are scrolled by binding them to
+        # different entries so the scroll bar talks to the control
+        # directly
+        self._vbar._viewport = self
+        return self._listbox
+
+    #####                                                   DATA #
+
+    def item_count(self):
+        return len(self._options)
+
+    def item(self, index):
+        return self._options.fetch(index, index+1)[0]
+
+    def set_data(self, data, length=None):
+        """Replace the entries shown by the list."""
+        self._options = option_source(data, length)
+        self._top = 0
+        self._focus_index = None
+        self._widget_focus = None
+        if self._region is not None:
+            self._bind_rows()
+            self._update_scrollbar()
+        if self.is_attached():
+            self.invalidate()
+
+    def update_elts(self, updated_elts):
+        self.set_data(updated_elts)
+
+    #####                                                   LAYOUT #
+
+    def allocate_space(self, allocation):
+        self._region = allocation
+        self._resize_pool(allocation.region_height())
+        super().allocate_space(allocation)
+        # keep the last page full if the list got taller
+        self._top = max(0, min(self._top, self.item_count()-len(self._listbox._children)))
+        self._bind_rows()
+        self._update_scrollbar()
+
+    def _resize_pool(self, rows):
+        pool = self._listbox._children
+        if len(pool) == rows:
+            return
+        while len(pool) > rows:
+            row = pool.pop()
+            if row.is_attached():
+                row.detach()
+        while len(pool) < rows:
+            row = _VirtualRow(label_text="", owner=self)
+            row.on_activate = self._handle_child_activation
+            self._listbox.add_child(row)
+        self._listbox.invalidate_layout()
+
+    def _bind_rows(self):
+        rows = self._listbox._children
+        focus = None
+        for (position, row) in enumerate(rows):
+            if self._top + position == self._focus_index:
+                focus = row
+        self._widget_focus = focus
+        # the frame focus can't stay on a row now showing some other
+        # entry; give it to the control, which still knows the entry
+        if self.is_attached():
+            frame_focus = self.frame().focus()
+            if frame_focus is not focus and frame_focus in rows:
+                self.owner().set_focus(self)
+        # sources that need to go elsewhere for the entries call back
+        # when they arrive; the rows are blank until then
+        start = self._top
+        for row in rows:
+            row._label_text = ""
+        self._options.fetch_async(start, start+len(rows), self._on_rows_fetched)
+
+    def _on_rows_fetched(self, start, options):
+        # ignore entries that arrive after the list has scrolled
+        # somewhere else
+        if start != self._top:
+            return
+        for (row, option) in zip(self._listbox._children, options):
+            # rows always fill the width of the list so changing
+            # their text doesn't need a relayout
+            row._label_text = str(option)
+        if self.is_attached():
+            self.invalidate()
+
+    def _update_scrollbar(self):
+        if self._vbar._region is None:
+            return
+        # scrollbar can't deal with 0 length content
+        extent = max(self.item_count(), 1)
+        self._vbar.update_extents((0, 0, 1, extent), self.height())
+        self._vbar.set_scroll_offset(self._top)
+
+    #####                                                   SCROLLING #
+
+    def _scroll_to(self, top):
+        rows = len(self._listbox._children)
+        top = max(0, min(top, self.item_count()-rows))
+        if top == self._top:
+            return
+        self._top = top
+        self._bind_rows()
+        self._update_scrollbar()
+        if self.is_attached():
+            self.invalidate()
+
+    def scroll_up_line(self):
+        self.scroll_up_lines(1)
+
+    def scroll_down_line(self):
+        self.scroll_down_lines(1)
+
+    def scroll_up_page(self):
+        self.scroll_up_lines(self.height()-1)
+
+    def scroll_down_page(self):
+        self.scroll_down_lines(self.height()-1)
+
+    def scroll_up_lines(self, delta):
+        self._scroll_to(self._top-delta)
+
+    def scroll_down_lines(self, delta):
+        self._scroll_to(self._top+delta)
+
+    def page_up(self):
+        self.scroll_up_page()
+        return True
+
+    def page_down(self):
+        self.scroll_down_page()
+        return True
+
+    #####                                                   FOCUS #
+
+    def set_focus(self, focus):
+        # as ListControl, but the frame focus always moves to the
+        # control rather than staying on one of the pooled rows
+        if self._widget_focus is not None:
+            self._widget_focus.note_focus_out()
+        self._widget_focus = focus
+        self.owner().set_focus(self)
+        if self._widget_focus is not None:
+            self._widget_focus.note_focus_in()
+        self.frame().invalidate(self)
+
+    def activate(self):
+        self.owner().set_focus(self)
+        if self._focus_index is None:
+            return self.control_focus_first_child()
+        return True
+
+    def note_focus_in(self):
+        if self._focus_index is None:
+            self.control_focus_first_child()
+
+    def accepts_focus(self):
+        return self.item_count() > 0
+
+    def is_widget_focus(self, widget):
+        return widget is not None and self._widget_focus == widget
+
+    def find_focused_child(self):
+        # returns the index of the focus entry rather than a row; the
+        # entry may have been scrolled out of view
+        return self._focus_index
+
+    def focus_item(self, index):
+        """Give the focus to the entry at index, scrolling it into view."""
+        rows = len(self._listbox._children)
+        self._focus_index = index
+        if index < self._top:
+            self._scroll_to(index)
+        elif index >= self._top+rows:
+            self._scroll_to(index-rows+1)
+        self._bind_rows()
+        self.set_focus(self._widget_focus)
+        return True
+
+    def _note_row_focused(self, row):
+        # the frame gave the focus straight to row, e.g. it was
+        # clicked; focus the entry it shows instead
+        self.focus_item(self._top + self._listbox._children.index(row))
+
+    def control_focus_first_child(self):
+        if self.item_count() == 0:
+            return False
+        return self.focus_item(0)
+
+    def control_cycle_focus_forward(self, selected):
+        # selected is the index of the focus entry
+        if selected+1 >= self.item_count():
+            return False
+        return self.focus_item(selected+1)
+
+    def control_cycle_focus_backward(self, selected):
+        if selected == 0:
+            return False
+        return self.focus_item(selected-1)
+
+    def _handle_child_activation(self, child):
+        index = self._top + self._listbox._children.index(child)
+        self.set_value(self.item(index))
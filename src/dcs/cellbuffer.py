@@ -0,0 +1,194 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from geometry.regions import Region
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class CellBuffer():
+    """Off-screen grid of character cells.
+
+    Each cell holds a character, a foreground colour, an attribute and
+    a background colour. Cells are stored row-major in one flat list
+    per component so runs of cells can be written with a single slice
+    assignment.
+
+    Writes outside the buffer, or outside the clip region if one is
+    set, are discarded. Rows that are written are remembered so
+    consumers can find the parts of the buffer that may have changed
+    without scanning all of it.
+    """
+    def __init__(self, width, height, fg=7, attr=0, bg=0, fill=' '):
+        self._width = width
+        self._height = height
+        size = width * height
+        self._chars = [fill] * size
+        self._fgs = [fg] * size
+        self._attrs = [attr] * size
+        self._bgs = [bg] * size
+        # indexes of rows written since "reset_dirty_rows" was last
+        # called
+        self._dirty_rows = set()
+        # writes are clipped to this ltrb
+        self._clip_ltrb = (0, 0, width, height)
+
+    def __repr__(self):
+        return "CellBuffer({}x{})".format(self._width, self._height)
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def clip(self):
+        """Return the clip region or None if there is no clip."""
+        (l, t, r, b) = self._clip_ltrb
+        if (l, t, r, b) == (0, 0, self._width, self._height):
+            return None
+        return Region(l, t, r, b)
+
+    def set_clip(self, region):
+        # region is None to remove the clip
+        if region is None:
+            self._clip_ltrb = (0, 0, self._width, self._height)
+        else:
+            (l, t, r, b) = region.ltrb()
+            self._clip_ltrb = (max(l, 0), max(t, 0),
+                               min(r, self._width), min(b, self._height))
+
+    def get(self, x, y):
+        """Return (char, fg, attr, bg) for the cell at x, y.
+
+        Returns None if the position is outside the buffer.
+        """
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        index = y*self._width + x
+        return (self._chars[index], self._fgs[index], self._attrs[index], self._bgs[index])
+
+    def print_at(self, text, x, y, fg, attr, bg):
+        # one cell per character
+        (cl, ct, cr, cb) = self._clip_ltrb
+        if y < ct or y >= cb:
+            return
+        if x < cl:
+            text = text[cl-x:]
+            x = cl
+        if x + len(text) > cr:
+            # the clip may be empty, leaving nothing to draw
+            text = text[:max(cr-x, 0)]
+        length = len(text)
+        if length <= 0:
+            return
+        start = y*self._width + x
+        end = start + length
+        self._chars[start:end] = text
+        self._fgs[start:end] = [fg] * length
+        self._attrs[start:end] = [attr] * length
+        self._bgs[start:end] = [bg] * length
+        self._dirty_rows.add(y)
+
+    def fill(self, left, top, right, bottom, char, fg, attr, bg):
+        # fill the cells in the half-open rectangle [left, right) x
+        # [top, bottom) with char
+        (cl, ct, cr, cb) = self._clip_ltrb
+        left = max(left, cl)
+        top = max(top, ct)
+        right = min(right, cr)
+        bottom = min(bottom, cb)
+        length = right - left
+        if length <= 0 or bottom <= top:
+            return
+        if length == self._width:
+            # whole rows are contiguous; fill them in one go
+            start = top*self._width
+            end = bottom*self._width
+            count = end - start
+            self._chars[start:end] = [char] * count
+            self._fgs[start:end] = [fg] * count
+            self._attrs[start:end] = [attr] * count
+            self._bgs[start:end] = [bg] * count
+            self._dirty_rows.update(range(top, bottom))
+            return
+        chars = [char] * length
+        fgs = [fg] * length
+        attrs = [attr] * length
+        bgs = [bg] * length
+        for y in range(top, bottom):
+            start = y*self._width + left
+            end = start + length
+            self._chars[start:end] = chars
+            self._fgs[start:end] = fgs
+            self._attrs[start:end] = attrs
+            self._bgs[start:end] = bgs
+            self._dirty_rows.add(y)
+
+    def horizontal_line(self, left, right, y, char, fg, attr, bg):
+        # draw char in the cells [left, right) of row y
+        if right > left:
+            self.print_at(char * (right-left), left, y, fg, attr, bg)
+
+    def vertical_line(self, x, top, bottom, char, fg, attr, bg):
+        # draw char in the cells [top, bottom) of column x. The cells
+        # are every width'th entry of the flat lists so the column is
+        # written with one extended slice assignment per component.
+        (cl, ct, cr, cb) = self._clip_ltrb
+        if x < cl or x >= cr:
+            return
+        top = max(top, ct)
+        bottom = min(bottom, cb)
+        count = bottom - top
+        if count <= 0:
+            return
+        width = self._width
+        start = top*width + x
+        end = start + (count-1)*width + 1
+        self._chars[start:end:width] = [char] * count
+        self._fgs[start:end:width] = [fg] * count
+        self._attrs[start:end:width] = [attr] * count
+        self._bgs[start:end:width] = [bg] * count
+        self._dirty_rows.update(range(top, bottom))
+
+    def row_runs(self, y, left, right):
+        """Return the cells [left, right) of row y as a list of (x,
+        text, fg, attr, bg) runs of cells drawn in the same colours
+        and attribute.
+        """
+        left = max(left, 0)
+        right = min(right, self._width)
+        if left >= right or not 0 <= y < self._height:
+            return []
+        row = y*self._width
+        (chars, fgs, attrs, bgs) = (self._chars, self._fgs, self._attrs, self._bgs)
+        runs = []
+        run_start = row + left
+        style = (fgs[run_start], attrs[run_start], bgs[run_start])
+        for index in range(run_start+1, row+right):
+            if (fgs[index], attrs[index], bgs[index]) != style:
+                runs.append((run_start-row, "".join(chars[run_start:index])) + style)
+                run_start = index
+                style = (fgs[index], attrs[index], bgs[index])
+        runs.append((run_start-row, "".join(chars[run_start:row+right])) + style)
+        return runs
+
+    def dirty_rows(self):
+        return self._dirty_rows
+
+    def reset_dirty_rows(self):
+        self._dirty_rows = set()
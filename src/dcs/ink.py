@@ -18,6 +18,18 @@ from logging import getLogger
 
 logger = getLogger(__name__)
 
+# Bumped whenever the pens bound anywhere (in a sheet or in the
+# theme) change or the sheet hierarchy changes. Sheets and frames
+# cache pen lookups and discard their caches when this changes.
+_pen_version = 0
+
+def pen_version():
+    return _pen_version
+
+def note_pens_changed():
+    global _pen_version
+    _pen_version += 1
+
 class Pen():
 
     def __init__(self, fg=7, attr=0, bg=0, fill=' '):
@@ -0,0 +1,335 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from random import random
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class TextBuffer():
+    """Text edited by a TextArea.
+
+    Positions in the text are given as a line index and a column
+    within the line. Lines are separated by "\\n" which is not
+    included in the line's text. Columns past the end of a line are
+    treated as the end of the line.
+
+    Subtypes must implement line_count, line_length, line_text, insert
+    and delete.
+    """
+    def line_count(self):
+        raise NotImplementedError("text buffers must implement line_count")
+
+    def line_length(self, line):
+        raise NotImplementedError("text buffers must implement line_length")
+
+    def line_text(self, line, start=0, stop=None):
+        """Return the text of line from column start up to stop.
+
+        Use this rather than "line" when only part of the line is
+        needed, e.g. the part that's visible; very long lines aren't
+        copied.
+        """
+        raise NotImplementedError("text buffers must implement line_text")
+
+    def line(self, line):
+        return self.line_text(line)
+
+    def insert(self, line, column, text):
+        """Insert text at line, column.
+
+        text may contain newlines. Returns the (line, column) of the
+        end of the inserted text.
+        """
+        raise NotImplementedError("text buffers must implement insert")
+
+    def delete(self, line, column, end_line, end_column):
+        """Delete the text from line, column up to end_line, end_column."""
+        raise NotImplementedError("text buffers must implement delete")
+
+    def text(self):
+        return "\n".join(self.line(index) for index in range(self.line_count()))
+
+
+# Text is inserted in pieces of at most this many characters, and
+# pieces are edited in place while they stay below the maximum
+_PIECE_SIZE = 512
+_MAX_PIECE_SIZE = 2048
+
+class _Piece():
+    # node in the rope. Pieces form a treap ordered by position in the
+    # text and heap ordered by priority. Each node records the number
+    # of characters and newlines in its subtree so offsets and line
+    # starts can be found without scanning the text.
+    __slots__ = ("text", "breaks", "priority", "left", "right", "length", "newlines")
+
+    def __init__(self, text, priority=None):
+        self.text = text
+        # newlines in this piece only
+        self.breaks = text.count("\n")
+        self.priority = random() if priority is None else priority
+        self.left = None
+        self.right = None
+        self.length = len(text)
+        self.newlines = self.breaks
+
+
+class RopeBuffer(TextBuffer):
+    """Text buffer held in a balanced tree of pieces of text.
+
+    Inserts and deletes cost O(log n) in the size of the text plus the
+    size of a piece, and finding the start of a line is O(log n)
+    since each node knows how many newlines its subtree holds.
+    """
+    def __init__(self, text=""):
+        self._root = _build(text)
+
+    def __repr__(self):
+        return "RopeBuffer({} lines, {} chars)".format(self.line_count(), self.length())
+
+    def length(self):
+        return _size(self._root)
+
+    def line_count(self):
+        return _breaks(self._root) + 1
+
+    def line_start(self, line):
+        """Return the offset of the first character of line."""
+        if line < 0 or line >= self.line_count():
+            raise IndexError("line out of range", line)
+        return 0 if line == 0 else self._newline_offset(line)+1
+
+    def line_end(self, line):
+        """Return the offset of the newline ending line, or the length
+        of the text for the last line."""
+        if line < 0 or line >= self.line_count():
+            raise IndexError("line out of range", line)
+        if line == self.line_count()-1:
+            return self.length()
+        return self._newline_offset(line+1)
+
+    def line_length(self, line):
+        return self.line_end(line) - self.line_start(line)
+
+    def line_text(self, line, start=0, stop=None):
+        line_start = self.line_start(line)
+        length = self.line_end(line) - line_start
+        stop = length if stop is None else min(stop, length)
+        if start >= stop:
+            return ""
+        return self.slice(line_start+start, line_start+stop)
+
+    def slice(self, start, stop):
+        """Return the text from offset start up to stop."""
+        pieces = []
+        _collect(self._root, start, stop, pieces)
+        return "".join(pieces)
+
+    def text(self):
+        return self.slice(0, self.length())
+
+    def offset(self, line, column):
+        """Return the offset of line, column in the text."""
+        line_start = self.line_start(line)
+        return line_start + min(column, self.line_end(line)-line_start)
+
+    def position(self, offset):
+        """Return the (line, column) of offset in the text."""
+        line = self._newlines_before(offset)
+        return (line, offset-self.line_start(line))
+
+    def insert(self, line, column, text):
+        offset = self.offset(line, column)
+        self.insert_at(offset, text)
+        return self.position(offset+len(text))
+
+    def delete(self, line, column, end_line, end_column):
+        self.delete_range(self.offset(line, column), self.offset(end_line, end_column))
+
+    def insert_at(self, offset, text):
+        if text == "":
+            return
+        (path, index) = self._path_to(offset, prefer_left=True)
+        if index is not None:
+            piece = path[-1]
+            if len(piece.text) + len(text) <= _MAX_PIECE_SIZE:
+                # common case of typing: edit the piece and fix up the
+                # totals on the way back to the root
+                piece.text = piece.text[:index] + text + piece.text[index:]
+                piece.breaks += text.count("\n")
+                for node in reversed(path):
+                    _update(node)
+                return
+        (left, right) = _split(self._root, offset)
+        self._root = _merge(_merge(left, _build(text)), right)
+
+    def delete_range(self, start, stop):
+        if start >= stop:
+            return
+        (path, index) = self._path_to(start, prefer_left=False)
+        if index is not None:
+            piece = path[-1]
+            if index+(stop-start) < len(piece.text) or (index > 0 and index+(stop-start) == len(piece.text)):
+                # deleted text is inside one piece and doesn't empty it
+                deleted = piece.text[index:index+stop-start]
+                piece.text = piece.text[:index] + piece.text[index+stop-start:]
+                piece.breaks -= deleted.count("\n")
+                for node in reversed(path):
+                    _update(node)
+                return
+        (left, rest) = _split(self._root, start)
+        (_, right) = _split(rest, stop-start)
+        self._root = _merge(left, right)
+
+    def _path_to(self, offset, prefer_left):
+        # return the nodes from the root to the piece containing
+        # offset, and the index of offset in that piece. If offset is
+        # at the boundary between pieces, prefer_left picks the end of
+        # the earlier piece rather than the start of the later one.
+        path = []
+        node = self._root
+        while node is not None:
+            path.append(node)
+            left_length = _size(node.left)
+            end = left_length + len(node.text)
+            if offset < left_length or (prefer_left and offset == left_length and node.left is not None):
+                node = node.left
+            elif offset < end or (prefer_left and offset == end):
+                return (path, offset-left_length)
+            else:
+                offset -= end
+                node = node.right
+        return (path, None)
+
+    def _newline_offset(self, count):
+        # return the offset of the count'th newline (1 is the first)
+        node = self._root
+        base = 0
+        while node is not None:
+            left_breaks = _breaks(node.left)
+            if count <= left_breaks:
+                node = node.left
+                continue
+            count -= left_breaks
+            base += _size(node.left)
+            if count <= node.breaks:
+                index = -1
+                for _ in range(count):
+                    index = node.text.index("\n", index+1)
+                return base + index
+            count -= node.breaks
+            base += len(node.text)
+            node = node.right
+        raise IndexError("no such newline", count)
+
+    def _newlines_before(self, offset):
+        # number of newlines in the text before offset
+        node = self._root
+        count = 0
+        while node is not None:
+            left_length = _size(node.left)
+            if offset < left_length:
+                node = node.left
+                continue
+            count += _breaks(node.left)
+            offset -= left_length
+            if offset <= len(node.text):
+                return count + node.text.count("\n", 0, offset)
+            count += node.breaks
+            offset -= len(node.text)
+            node = node.right
+        return count
+
+
+def _size(node):
+    return 0 if node is None else node.length
+
+
+def _breaks(node):
+    return 0 if node is None else node.newlines
+
+
+def _update(node):
+    node.length = len(node.text) + _size(node.left) + _size(node.right)
+    node.newlines = node.breaks + _breaks(node.left) + _breaks(node.right)
+
+
+def _split(node, offset):
+    # split the tree rooted at node into trees holding the first
+    # offset characters and the rest
+    if node is None:
+        return (None, None)
+    left_length = _size(node.left)
+    end = left_length + len(node.text)
+    if offset <= left_length:
+        (left, right) = _split(node.left, offset)
+        node.left = right
+        _update(node)
+        return (left, node)
+    if offset >= end:
+        (left, right) = _split(node.right, offset-end)
+        node.right = left
+        _update(node)
+        return (node, right)
+    # split falls inside this piece; the new piece takes the same
+    # priority so it can take this node's place in the right tree
+    index = offset - left_length
+    tail = _Piece(node.text[index:], node.priority)
+    node.text = node.text[:index]
+    node.breaks -= tail.breaks
+    tail.right = node.right
+    node.right = None
+    _update(node)
+    _update(tail)
+    return (node, tail)
+
+
+def _merge(left, right):
+    # join two trees; all of left comes before all of right
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _build(text):
+    root = None
+    for start in range(0, len(text), _PIECE_SIZE):
+        root = _merge(root, _Piece(text[start:start+_PIECE_SIZE]))
+    return root
+
+
+def _collect(node, start, stop, pieces):
+    # append the text from start up to stop in the tree rooted at node
+    # to pieces; start and stop are relative to the start of the tree
+    if node is None or start >= stop:
+        return
+    left_length = _size(node.left)
+    end = left_length + len(node.text)
+    if start < left_length:
+        _collect(node.left, start, min(stop, left_length), pieces)
+    if start < end and stop > left_length:
+        pieces.append(node.text[max(start-left_length, 0):stop-left_length])
+    if stop > end:
+        _collect(node.right, max(start-end, 0), stop-end, pieces)
@@ -21,14 +21,51 @@ from logging import getLogger
 
 logger = getLogger(__name__)
 
-# keycode :: Command object map
-# Commands the frame deals with go in this map
+# command table name :: Keymap
+# Commands the frame deals with go in the "global" keymap
 
 # TODO: need to be able to find keys for accelerators for commands to
 # show in menus and on buttons etc. For now, the different top level
 # sheets are responsible for doing this. (won't be efficient!)
 COMMANDS = {}
 
+# Bumped whenever a command is registered; keymaps resolved from the
+# command tables are out of date when this changes.
+_keymap_version = 0
+
+def keymap_version():
+    return _keymap_version
+
+
+class Keymap(dict):
+    """Map of keycode to Command, or to a Keymap for the keys that can
+    follow that keycode in a multi-key sequence.
+
+    Key sequences form a trie; "C-x C-s" is a Keymap entry for C-x
+    whose own entry for C-s is the Command.
+    """
+    def __repr__(self):
+        return "Keymap({} keys)".format(len(self))
+
+    def bind(self, keys, command):
+        # keys is a sequence of keycodes. A key can start multi-key
+        # commands or be a command itself but not both; binding one
+        # over the other would lose commands so raises RuntimeError.
+        keymap = self
+        for (index, key) in enumerate(keys[:-1]):
+            entry = keymap.get(key)
+            if entry is None:
+                entry = Keymap()
+                keymap[key] = entry
+            elif not isinstance(entry, Keymap):
+                raise RuntimeError("key sequence {} is bound to {}".format(
+                    keys[:index+1], entry))
+            keymap = entry
+        if isinstance(keymap.get(keys[-1]), Keymap):
+            raise RuntimeError("key sequence {} starts {}".format(
+                keys, keymap[keys[-1]]))
+        keymap[keys[-1]] = command
+
 
 class Command():
 
@@ -55,22 +92,35 @@ class Command():
 
 
 def register_command(keys, command, command_table="global"):
+    """Bind command to each of keys in command_table.
+
+    Each key is a keycode or, for multi-key commands, a tuple of
+    keycodes:
+
+        register_command([(Screen.ctrl("t"), Screen.ctrl("s"))], save_command)
+    """
+    global _keymap_version
     if not command_table in COMMANDS:
-        COMMANDS[command_table] = {}
+        COMMANDS[command_table] = Keymap()
     for key in keys:
-        # FIXME: check if key is already bound
-        # FIXME: deal with "C-x C-c" type commands?
-        COMMANDS[command_table][key] = command
+        COMMANDS[command_table].bind(key if isinstance(key, tuple) else (key,), command)
+    _keymap_version += 1
 
 def find_command(key_event, command_table="global"):
+    # single key commands only; the first key of a multi-key command
+    # is dealt with by the frame, see "Frame._handle_key_sequence"
     cmd = None
     if key_event.key_code:
-        try:
-            cmd = COMMANDS[command_table][key_event.key_code]
-        except KeyError:
-            pass
+        cmd = COMMANDS.get(command_table, _EMPTY_KEYMAP).get(key_event.key_code)
+        if isinstance(cmd, Keymap):
+            cmd = None
     return cmd
 
+def command_keymap(command_table):
+    return COMMANDS.get(command_table, _EMPTY_KEYMAP)
+
+_EMPTY_KEYMAP = Keymap()
+
 
 ### Commands on Frame
 def populate_global():
@@ -0,0 +1,106 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from dcs.cellbuffer import CellBuffer
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class Compositor(CellBuffer):
+    """Cell buffer between the top level sheets and the screen.
+
+    Top level sheets draw into the compositor instead of directly onto
+    the screen. When the frame refreshes, the rows written since the
+    previous refresh are compared against the cells last sent to the
+    screen and only the cells that differ are emitted, batched into
+    runs that share the same colours and attributes.
+    """
+    def __init__(self, screen):
+        # asciimatics starts with a buffer of white on black spaces;
+        # match that so cells that are never drawn are never sent.
+        super().__init__(screen.width, screen.height)
+        self._screen = screen
+        # copy of the cells most recently sent to the screen
+        self._front_chars = list(self._chars)
+        self._front_fgs = list(self._fgs)
+        self._front_attrs = list(self._attrs)
+        self._front_bgs = list(self._bgs)
+        # drawing cursor used by "draw_to"; in cells
+        self._cursor = (0, 0)
+
+    def __repr__(self):
+        return "Compositor({}x{})".format(self._width, self._height)
+
+    def move(self, x, y):
+        self._cursor = (x, y)
+
+    def cursor(self):
+        return self._cursor
+
+    def refresh(self):
+        self.flush()
+        self._screen.refresh()
+
+    def flush(self):
+        """Send changed cells to the screen.
+
+        Returns the number of print_at calls made.
+        """
+        calls = 0
+        width = self._width
+        for y in sorted(self._dirty_rows):
+            start = y*width
+            end = start+width
+            chars = self._chars[start:end]
+            fgs = self._fgs[start:end]
+            attrs = self._attrs[start:end]
+            bgs = self._bgs[start:end]
+            front_chars = self._front_chars[start:end]
+            front_fgs = self._front_fgs[start:end]
+            front_attrs = self._front_attrs[start:end]
+            front_bgs = self._front_bgs[start:end]
+            if chars == front_chars and fgs == front_fgs \
+               and attrs == front_attrs and bgs == front_bgs:
+                continue
+            x = 0
+            while x < width:
+                if chars[x] == front_chars[x] and fgs[x] == front_fgs[x] \
+                   and attrs[x] == front_attrs[x] and bgs[x] == front_bgs[x]:
+                    x += 1
+                    continue
+                # start of a run of changed cells; extend it over
+                # following cells drawn with the same pen, whether
+                # they changed or not, and emit up to the last changed
+                # cell in the run.
+                (fg, attr, bg) = (fgs[x], attrs[x], bgs[x])
+                run_start = x
+                last_changed = x
+                x += 1
+                while x < width and fgs[x] == fg and attrs[x] == attr and bgs[x] == bg:
+                    if chars[x] != front_chars[x] or fg != front_fgs[x] \
+                       or attr != front_attrs[x] or bg != front_bgs[x]:
+                        last_changed = x
+                    x += 1
+                self._screen.print_at(''.join(chars[run_start:last_changed+1]),
+                                      run_start, y, colour=fg, attr=attr, bg=bg)
+                calls += 1
+            self._front_chars[start:end] = chars
+            self._front_fgs[start:end] = fgs
+            self._front_attrs[start:end] = attrs
+            self._front_bgs[start:end] = bgs
+        self.reset_dirty_rows()
+        return calls
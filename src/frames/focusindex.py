@@ -0,0 +1,120 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from sheets.sheet import Sheet, tree_version
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class FocusIndex():
+    """Tab order of the sheets in a top level sheet.
+
+    Holds the sheets that might accept the focus in the order the
+    "find_next_focus" / "find_prev_focus" walks visit them, and where
+    every sheet the walks visit falls in that order, so finding the
+    next or previous focus starts from the current focus instead of
+    walking the tree from the top. Also holds the order "find_focus_candidate" visits
+    them in, which puts children before their parents.
+
+    Sheets are in the index if their type implements "accepts_focus";
+    whether they accept the focus is asked when moving the focus, so
+    widgets can change their minds without the index being rebuilt.
+    The index is rebuilt the first time it's used after any sheet is
+    added, removed, attached or detached.
+    """
+    def __init__(self, top_level):
+        self._top_level = top_level
+        # tree version the index was built at
+        self._version = None
+        # candidates in tab order, and sheet -> position of the first
+        # candidate at or after the sheet in the walk
+        self._order = []
+        self._positions = dict()
+        # candidates in "find_focus_candidate" order
+        self._candidate_order = []
+
+    def __repr__(self):
+        return "FocusIndex({} candidates)".format(len(self._order))
+
+    def invalidate(self):
+        self._version = None
+
+    def first_focus(self, from_end=False):
+        """As "find_focus_candidate"."""
+        self._check_version()
+        if from_end:
+            # the walk from the end visits sheets in the reverse of
+            # tab order
+            return _first_accepting(reversed(self._order))
+        return _first_accepting(self._candidate_order)
+
+    def next_focus(self, current_focus):
+        """As "find_next_focus"; returns (found, next focus)."""
+        self._check_version()
+        position = self._positions.get(current_focus)
+        if position is None:
+            return (False, None)
+        order = self._order
+        if position < len(order) and order[position] is current_focus:
+            position += 1
+        for index in range(position, len(order)):
+            if order[index].accepts_focus():
+                return (True, order[index])
+        return (True, None)
+
+    def prev_focus(self, current_focus):
+        """As "find_prev_focus"; returns (found, previous focus)."""
+        self._check_version()
+        position = self._positions.get(current_focus)
+        if position is None:
+            return (False, _first_accepting(reversed(self._order)))
+        order = self._order
+        for index in range(position-1, -1, -1):
+            if order[index].accepts_focus():
+                return (True, order[index])
+        return (True, None)
+
+    def _check_version(self):
+        if self._version != tree_version():
+            self._rebuild()
+
+    def _rebuild(self):
+        self._version = tree_version()
+        self._order = []
+        self._positions = dict()
+        self._candidate_order = []
+        self._index_sheet(self._top_level)
+
+    def _index_sheet(self, sheet):
+        # sheets that don't implement "accepts_focus" never accept
+        # the focus, but the current focus may be any sheet so all
+        # have positions
+        self._positions[sheet] = len(self._order)
+        candidate = type(sheet).accepts_focus is not Sheet.accepts_focus
+        if candidate:
+            self._order.append(sheet)
+        for child in sheet.focus_children():
+            self._index_sheet(child)
+        if candidate:
+            self._candidate_order.append(sheet)
+
+
+def _first_accepting(sheets):
+    for sheet in sheets:
+        if sheet.accepts_focus():
+            return sheet
+    return None
@@ -14,9 +14,14 @@
 # limitations under the License.
 #
 
+import asyncio
+import os
+import select
 import signal
-
-from collections import deque
+import sys
+import threading
+from functools import lru_cache
+from time import perf_counter
 
 from asciimatics.screen import Screen
 from asciimatics.widgets.utilities import THEMES
@@ -24,16 +29,31 @@ from asciimatics.event import KeyboardEvent, MouseEvent
 from asciimatics.exceptions import ResizeScreenError
 
 from sheets.sheet import Sheet
-from dcs.ink import Pen
-from geometry.regions import Region
+from dcs.ink import Pen, note_pens_changed
+from geometry.regions import Region, merge_regions
 from geometry.points import Point
-from frames.commands import find_command
+from frames.commands import Command, Keymap, command_keymap, keymap_version
+from frames.compositor import Compositor
 from frames.frame_manager import FrameManager
+from frames.theme import Theme
+from frames.stats import FrameStats, set_recording_stats
 
 from logging import getLogger
 
 logger = getLogger(__name__)
 
+# seconds between checks for input when the screen can't say when
+# input is ready
+INPUT_POLL_INTERVAL = 0.01
+
+# longest "start_frame" waits for input before running posted
+# callbacks, on platforms where it can't be woken up early
+POST_POLL_INTERVAL = 0.1
+
+# seconds allowed between the keys of a multi-key command before the
+# keys typed so far are forgotten
+KEY_SEQUENCE_TIMEOUT = 2.0
+
 class Frame():
     """Represents a TUI application.
 
@@ -62,49 +82,129 @@ class Frame():
         self._process_event(event)
 
     def __init__(self, screen):
-        # override screen resized handler from asciimatics for
-        # immediate handling
-        screen._signal_state.set(signal.SIGWINCH, self._resize_handler)
-        # use ctrl+c for copy and paste
-        screen._signal_state.set(signal.SIGINT, self._handle_interrupt)
-        #screen._signal_state.set(signal.SIGSTP, self._handle_interrupt)
+        # headless screens don't have a terminal so don't get signals
+        if hasattr(screen, "_signal_state"):
+            # override screen resized handler from asciimatics for
+            # immediate handling
+            screen._signal_state.set(signal.SIGWINCH, self._resize_handler)
+            # use ctrl+c for copy and paste
+            screen._signal_state.set(signal.SIGINT, self._handle_interrupt)
+            #screen._signal_state.set(signal.SIGSTP, self._handle_interrupt)
         self._dialog = None
         self._focus = None
-        self._invalidated_sheets = deque()
+        # sheets waiting to be redrawn, in the order they were
+        # invalidated. Only the keys are used; a dict gives constant
+        # time membership tests whilst keeping the order.
+        self._invalidated_sheets = dict()
+        # sheets whose space requirements may have changed, in the
+        # order they were reported; see "relayout_invalidated_sheets"
+        self._relayout_sheets = dict()
+        # screen rectangles that need repainting from whatever is
+        # visible beneath them, e.g. after a popup is removed
+        self._damaged_regions = []
         self._menu = None
         self._screen = screen
+        # top level sheets draw into the compositor; it sends the
+        # cells that changed to the screen on refresh.
+        self._compositor = Compositor(screen)
         self._top_level_sheet = None
+        self._theme = Theme(FrameManager.THEMES)
+        # FrameStats when instrumentation is enabled; see
+        # "enable_stats"
+        self._stats = None
+        self._stats_overlay = False
+        # times events were received that haven't been painted yet,
+        # when recording stats
+        self._event_starts = []
+        # asyncio event loop when running "start_frame_async", the
+        # future that finishes it, and whether a paint is scheduled
+        self._loop = None
+        self._loop_done = None
+        self._input_poll = None
+        self._paint_requested = False
+        # callbacks posted from other threads; see "post". Keys are
+        # given by the poster or made up. _wake_pending is set when
+        # the UI thread has been woken up to run them and not yet
+        # done so.
+        self._posted_lock = threading.Lock()
+        self._posted = dict()
+        self._wake_pending = False
+        # pipe written to wake "start_frame" from waiting for input.
+        # Only terminals on posix systems wait on a file descriptor;
+        # elsewhere "start_frame" polls for posted callbacks.
+        self._wake_pipe = None
+        if isinstance(screen, Screen) and sys.platform != "win32":
+            self._wake_pipe = os.pipe()
+            for fd in self._wake_pipe:
+                os.set_blocking(fd, False)
+        # thread the frame runs in; sheets are only changed from it
+        self._thread = threading.get_ident()
+        # most paints per second, or None for no limit, and when the
+        # last paint was done
+        self._max_fps = None
+        self._last_paint = None
+        # keymaps of the multi-key commands the keys typed so far are
+        # a prefix of, as (keymap, client) pairs, and when they time
+        # out; see "_handle_key_sequence"
+        self._key_sequence = None
+        self._key_sequence_deadline = None
+        # tuple of command table names -> resolved lookup, for the
+        # commands registered at _keymaps_version; see
+        # "_resolved_keymap"
+        self._keymaps_version = None
+        self._resolved_keymaps = dict()
 
     def __repr__(self):
         return "Frame({}x{})".format(self._screen.width, self._screen.height)
 
     def pen(self, role, state, pen):
-        if role not in FrameManager.THEMES:
-            logger.info(f"Role entry '{role}' not found. Using role 'undefined'")
-            role = "undefined"
-        # If desired pen not found in role / state, try to find it in
-        # role / default state (and log it).
-        #
-        # If desired pen not found in role / default state, log it and
-        # use role / default / "pen".
-        if state not in FrameManager.THEMES[role]:
-            logger.info("State entry '%s' not found for role '%s'. Using state 'default'",
-                        state, role)
-            state = "default"
-        if pen not in FrameManager.THEMES[role][state]:
-            if state != "default":
-                logger.info("Pen type '%s' not found for theme[%s][%s]. "
-                            + "Looking in state 'default'",
-                            pen, role, state)
-                state = "default"
-            if pen not in FrameManager.THEMES[role][state]:
-                logger.info("Pen type '%s' not found for theme[%s][%s]. Using 'pen'",
-                            pen, role, state)
-                pen = "pen"
-        try:
-            return FrameManager.THEMES[role][state][pen]
-        except KeyError:
-            raise KeyError(f"Failed to find FrameManager.THEMES[{role}][{state}][{pen}]")
+        return self._theme.pen(role, state, pen)
+
+    def theme(self):
+        return self._theme
+
+    def set_theme(self, theme):
+        """Replace the frame's theme and redraw everything with it."""
+        self._theme = theme
+        # sheets have cached pens from the old theme
+        note_pens_changed()
+        for top_level in [self._top_level_sheet, self._dialog, self._menu]:
+            if top_level is not None and top_level.is_attached():
+                self.invalidate(top_level)
+
+    def stats(self):
+        """Return the FrameStats being recorded, or None."""
+        return self._stats
+
+    def enable_stats(self, overlay=False, history=256):
+        """Start recording FrameStats.
+
+        If overlay is True the frame rate, and the p50/p99 event
+        latency and paint time, are shown in the top right corner of
+        the screen.
+        """
+        self._stats = FrameStats(history=history)
+        self._stats_overlay = overlay
+        set_recording_stats(self._stats)
+        return self._stats
+
+    def disable_stats(self):
+        if self._stats_overlay:
+            self.invalidate_region(self._stats_overlay_region())
+        if self._stats is not None:
+            set_recording_stats(None)
+        self._stats = None
+        self._stats_overlay = False
+
+    def _stats_overlay_region(self):
+        width = len(self._stats.overlay_text())
+        return Region(max(self._screen.width-width, 0), 0, self._screen.width, 1)
+
+    def _draw_stats_overlay(self):
+        region = self._stats_overlay_region()
+        (left, top, _, _) = region.ltrb()
+        self._compositor.print_at(self._stats.overlay_text(), left, top,
+                                  Screen.COLOUR_WHITE, Screen.A_BOLD, Screen.COLOUR_BLUE)
 
     def set_top_level_sheet(self, sheet):
         self._top_level_sheet = sheet
@@ -119,10 +219,33 @@ class Frame():
         # latency is in the TUI code and need to find speedups there,
         # or just in the event loop. Wonder if the event loop piece
         # can be done in an async way?
+        self._thread = threading.get_ident()
+        # run anything posted before the frame started, and show
+        # anything changed
+        self._run_posted()
+        self._paint()
         while True:
-            self._screen.wait_for_input(60)
-            event = self._screen.get_event()
-            self._process_event(event)
+            self._wait_for_input(self._paint_delay())
+            self._run_posted()
+            # handle all the input waiting before painting so bursts
+            # of events, e.g. held keys, are painted once
+            self._read_input()
+            if self._paint_delay() == 0:
+                self._paint()
+
+    def _wait_for_input(self, timeout):
+        # wait for input, or for a callback to be posted from another
+        # thread. Terminals on posix systems wait on stdin and the
+        # wake up pipe together; elsewhere the wait is cut short so
+        # posted callbacks aren't held up for long.
+        if self._wake_pipe is None:
+            self._screen.wait_for_input(min(timeout, POST_POLL_INTERVAL))
+            return
+        try:
+            select.select([sys.stdin, self._wake_pipe[0]], [], [], timeout)
+        except OSError:
+            # as asciimatics; errors will show up reading the input
+            pass
 
     # called to handle events when input events occur; can also be
     # called arbitrarily to redraw invalidated sheets
@@ -138,6 +261,13 @@ class Frame():
         # QUERY: HOW IS <TAB> HANDLED? - consider text fields +
         # boxes.
         # What to do about mnemonics?
+        self._dispatch_event(event)
+        # if event has caused widget to need redrawing, do it now
+        self._paint()
+
+    def _dispatch_event(self, event):
+        if event is not None and self._stats is not None:
+            self._event_starts.append(perf_counter())
         if isinstance(event, KeyboardEvent):
             self._handle_key_event(event)
         # mouse events go to frontmost sheet under pointer and then
@@ -152,27 +282,81 @@ class Frame():
         # sure if want to create a hierarchy of events or to just
         # keep it simple.
 
-        # if event has caused widget to need redrawing, do it now
-        self.render_invalidated_sheets()
+    def _paint(self):
+        # lay out and redraw whatever events and callbacks have
+        # invalidated since the last paint. Nothing is done, not even
+        # refreshing the screen, if nothing has changed.
+        if self._needs_paint():
+            if self._relayout_sheets:
+                stats = self._stats
+                if stats is not None:
+                    start = perf_counter()
+                self.relayout_invalidated_sheets()
+                if stats is not None:
+                    stats.record_layout(perf_counter()-start)
+            self.render_invalidated_sheets()
+            self._last_paint = perf_counter()
+        if self._event_starts:
+            if self._stats is not None:
+                end = perf_counter()
+                for start in self._event_starts:
+                    self._stats.record_latency(end-start)
+            self._event_starts = []
+
+    def _needs_paint(self):
+        # sheets drawn outside of a paint, e.g. new dialogs, are only
+        # in the compositor until it's next refreshed
+        return bool(self._invalidated_sheets or self._relayout_sheets
+                    or self._damaged_regions or self._compositor.dirty_rows())
+
+    def max_fps(self):
+        return self._max_fps
+
+    def set_max_fps(self, fps):
+        """Limit the number of paints per second.
+
+        Changes made while the frame waits to paint again are painted
+        together. None removes the limit, so the frame paints as soon
+        as each batch of input has been handled.
+        """
+        if fps is not None and fps <= 0:
+            raise ValueError("max fps must be positive", fps)
+        self._max_fps = fps
+
+    def _paint_delay(self):
+        # seconds until the frame should paint; 0 to paint now, or
+        # the longest time to wait for input if there's nothing to
+        # paint
+        if not self._needs_paint():
+            return 60
+        if self._max_fps is None or self._last_paint is None:
+            return 0
+        return max(self._last_paint + 1/self._max_fps - perf_counter(), 0)
 
     def _handle_key_event(self, event):
 
         logger.debug("_HANDLE_KEY_EVENT entered for frame %s and event %s [keycode %s]",
                      self, event, event.key_code)
 
+        # fixme: just use the focus widget? What if there isn't one?
+        focus_top_level = self._get_focus_top_level()
+
+        entries = self._command_entries(event.key_code, focus_top_level) \
+            if event.key_code else []
+        handled = self._handle_key_sequence(event, entries)
+        if handled is not None:
+            return handled
+
         # Handle accelerators from the default "command table". Why
         # don't TAB / S+TAB work here?
-        command = find_command(event)
-        if command is not None:
+        if entries and entries[0][1] is self:
+            command = entries[0][0]
 
             logger.debug("________ got command for %s of %s", self, command)
 
             if command.apply(self):
                 return True
 
-        # fixme: just use the focus widget? What if there isn't one?
-        focus_top_level = self._get_focus_top_level()
-
         logger.debug("________ key event not handled, trying to handle in top level %s",
                      focus_top_level)
 
@@ -269,7 +453,9 @@ class Frame():
 
         event_top_level = self._get_focus_top_level()
 
-        sheet = event_top_level.find_highest_sheet_containing_position(Point(event.x, event.y))
+        # top levels index their sheets by screen position so this
+        # doesn't walk the sheet tree
+        (sheet, _) = event_top_level.sheet_at(event.x, event.y)
         if not sheet and event_top_level == self._menu:
             # Check if event occurred in the (modal) dialog (if there
             # is one) or in the top level sheet otherwise
@@ -281,16 +467,14 @@ class Frame():
 
         event_top_level = self._get_focus_top_level()
 
-        sheet = event_top_level.find_highest_sheet_containing_position(Point(event.x, event.y))
+        (sheet, inverse) = event_top_level.sheet_at(event.x, event.y)
         if sheet:
             # mouse events come in to the event handler with screen
             # coordinates; convert to the coordinates used by the
             # highest (in z-order) sheet containing that screen
             # position.
-            # transform = sheet → screen
-            transform = sheet.get_screen_transform()
             # inverse = screen → sheet
-            (sx, sy) = transform.inverse().transform_point(Point(event.x, event.y)).xy()
+            (sx, sy) = inverse.transform_xy(event.x, event.y)
             # if the child declines to deal with the event, pass it
             # back up the widget hierarchy in case a parent wants to
             # do something with the event. This allows some parents to
@@ -301,9 +485,40 @@ class Frame():
             sheet.handle_event(MouseEvent(sx, sy, event.buttons))
 
     def lay_out_frame(self):
+        stats = self._stats
+        if stats is not None:
+            start = perf_counter()
         region = Region(0, 0, self._screen.width, self._screen.height)
-        self._top_level_sheet.allocate_space(region)
-        self._top_level_sheet.layout()
+        top_level = self._top_level_sheet
+        if top_level._region is not None \
+           and top_level._region.ltrb() == region.ltrb():
+            # screen hasn't changed size; only lay out the parts of
+            # the tree that changed
+            self.relayout_invalidated_sheets()
+        else:
+            top_level.allocate_space(region)
+            top_level.layout()
+            self._relayout_sheets = dict()
+        if stats is not None:
+            stats.record_layout(perf_counter()-start)
+
+    def invalidate_layout(self, sheet):
+        if threading.get_ident() != self._thread:
+            self.post(self.invalidate_layout, sheet, key=("invalidate_layout", sheet))
+            return
+        self._relayout_sheets[sheet] = None
+        if self._loop is not None:
+            self._request_paint()
+
+    def relayout_invalidated_sheets(self):
+        relayout = self._relayout_sheets
+        while relayout:
+            sheet = next(iter(relayout))
+            del relayout[sheet]
+            # sheets already dealt with by an earlier relayout no
+            # longer need it
+            if sheet.is_attached() and sheet.needs_relayout():
+                sheet.relayout()
 
     def show_dialog(self, dialog, coord=None):
         if self._dialog is not None:
@@ -351,11 +566,17 @@ class Frame():
 
     def dialog_quit(self):
         if self._dialog is not None:
+            # only the part of the screen the dialog covered needs
+            # repainting
+            dialog = self._dialog
+            region = dialog.get_screen_transform().transform_region(dialog._region)
             # detach will also recursively move all children into a
             # detached state
-            self._dialog.detach()
+            dialog.detach()
             self._dialog = None
-            self.render()
+            # the event loop repaints the damage once the event has
+            # been dealt with
+            self.invalidate_region(region)
 
     def show_popup(self, menu, coord):
         if self._menu is not None:
@@ -394,11 +615,17 @@ class Frame():
 
     def menu_quit(self):
         if self._menu is not None:
+            # only the part of the screen the menu covered needs
+            # repainting
+            menu = self._menu
+            region = menu.get_screen_transform().transform_region(menu._region)
             # detach will also recursively move all children into a
             # detached state
-            self._menu.detach()
+            menu.detach()
             self._menu = None
-            self.render()
+            # the event loop repaints the damage once the event has
+            # been dealt with
+            self.invalidate_region(region)
 
     def render(self):
         self._top_level_sheet.render()
@@ -406,18 +633,403 @@ class Frame():
             self._dialog.render()
         if self._menu is not None:
             self._menu.render()
-        self._screen.refresh()
+        # everything has been redrawn so there's no damage left
+        self._damaged_regions = []
+        self._compositor.refresh()
 
     def invalidate(self, sheet):
-        if sheet not in self._invalidated_sheets:
-            self._invalidated_sheets.append(sheet)
+        if threading.get_ident() != self._thread:
+            # the UI thread redraws the sheet when it next runs posted
+            # callbacks
+            self.post(self.invalidate, sheet, key=("invalidate", sheet))
+            return
+        invalidated = self._invalidated_sheets
+        if sheet in invalidated:
+            return
+        # rendering a sheet renders all its descendants; if an
+        # ancestor is already waiting to be redrawn there's nothing
+        # more to do
+        ancestor = sheet._parent
+        while ancestor is not None:
+            if ancestor in invalidated:
+                _note_redrawn_by(sheet, ancestor)
+                return
+            ancestor = ancestor._parent
+        # conversely, any waiting descendants of this sheet will be
+        # redrawn along with it
+        if sheet._children and invalidated:
+            for waiting in [waiting for waiting in invalidated
+                            if _is_ancestor(sheet, waiting)]:
+                del invalidated[waiting]
+                _note_redrawn_by(waiting, sheet)
+        invalidated[sheet] = None
+        if self._loop is not None:
+            self._request_paint()
 
     def render_invalidated_sheets(self):
-        while len(self._invalidated_sheets) > 0:
-            sheet = self._invalidated_sheets.popleft()
+        # rendering may invalidate further sheets so pop them one at
+        # a time rather than iterating
+        invalidated = self._invalidated_sheets
+        stats = self._stats
+        if stats is not None:
+            paint_start = perf_counter()
+        # popups drawn over by sheets beneath them
+        overdrawn = []
+        while invalidated:
+            sheet = next(iter(invalidated))
+            del invalidated[sheet]
             if not sheet.is_detached():
-                sheet.render()
-        self._screen.refresh()
+                if stats is None:
+                    sheet.render()
+                else:
+                    start = perf_counter()
+                    sheet.render()
+                    stats.record_render(sheet, perf_counter()-start)
+                for popup in self._popups_over(sheet):
+                    if popup not in overdrawn:
+                        overdrawn.append(popup)
+        # popups are highest in the z-order; draw them again where
+        # sheets under them were redrawn, e.g. after the focus moves
+        # to the widget that opened them
+        for popup in [self._dialog, self._menu]:
+            if popup in overdrawn:
+                popup.render()
+        self._repair_damage()
+        if stats is not None and self._stats_overlay:
+            # shows the figures up to the previous paint
+            self._draw_stats_overlay()
+        self._compositor.refresh()
+        if stats is not None:
+            stats.record_paint(perf_counter()-paint_start)
+
+    def _popups_over(self, sheet):
+        # return the dialog and menu if they're above sheet in the
+        # z-order and overlap it
+        top_level = sheet.top_level_sheet()
+        if top_level is self._menu:
+            return []
+        popups = [self._menu] if top_level is self._dialog else [self._dialog, self._menu]
+        screen_clip = None
+        found = []
+        for popup in popups:
+            if popup is None or popup.is_detached():
+                continue
+            if screen_clip is None:
+                screen_clip = sheet.screen_clip()
+                if screen_clip is None:
+                    return []
+            region = popup.get_screen_transform().transform_region(popup._region)
+            if region.region_intersection(screen_clip) is not None:
+                found.append(popup)
+        return found
+
+    def invalidate_region(self, region):
+        # region is in screen coordinates
+        if threading.get_ident() != self._thread:
+            self.post(self.invalidate_region, region)
+            return
+        self._damaged_regions.append(region)
+        if self._loop is not None:
+            self._request_paint()
+
+    def _repair_damage(self):
+        # Redraw each damaged rectangle by rendering every top level
+        # sheet that overlaps it, bottom of the z-order first, with
+        # drawing clipped to the rectangle.
+        damaged = merge_regions(self._damaged_regions)
+        self._damaged_regions = []
+        top_levels = [self._top_level_sheet, self._dialog, self._menu]
+        for region in damaged:
+            self._compositor.set_clip(region)
+            for top_level in top_levels:
+                if top_level is None or top_level.is_detached():
+                    continue
+                screen_region = top_level.get_screen_transform().transform_region(top_level._region)
+                if screen_region.region_intersection(region) is not None:
+                    top_level.render()
+            self._compositor.set_clip(None)
+
+    #### asyncio event loop ##########################################
+
+    # An alternative to "start_frame" for applications that do other
+    # I/O or need timers. Input is read when the terminal says it's
+    # ready and callbacks, timers and tasks on the same loop can
+    # update widgets. Sheets invalidated by events or callbacks are
+    # painted once per pass of the loop, not once per change.
+
+    async def start_frame_async(self):
+        """Run the frame on the running asyncio event loop.
+
+        Like "start_frame" this only finishes by raising, e.g.
+        StopApplication when the user quits, or whatever exception a
+        callback scheduled with "call_soon", "call_later" or
+        "create_task" raises.
+
+            asyncio.run(frame.start_frame_async())
+        """
+        if self._loop is not None:
+            raise RuntimeError("frame is already running an event loop", self)
+        loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        self._loop = loop
+        self._loop_done = loop.create_future()
+        reader = self._watch_input(loop)
+        # run anything posted before the loop started
+        with self._posted_lock:
+            if self._posted:
+                self._wake_pending = True
+                loop.call_soon(self._run_guarded, self._run_posted)
+        # paint anything invalidated before the loop started
+        self._request_paint()
+        try:
+            await self._loop_done
+        finally:
+            if reader is not None:
+                loop.remove_reader(reader)
+            if self._input_poll is not None:
+                self._input_poll.cancel()
+                self._input_poll = None
+            self._loop = None
+            self._loop_done = None
+            self._paint_requested = False
+
+    def call_soon(self, callback, *args):
+        """Call callback(*args) on the frame's event loop.
+
+        Any sheets the callback invalidates are painted afterwards.
+        Returns an asyncio.Handle.
+        """
+        return self._running_loop().call_soon(self._run_guarded, callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """Call callback(*args) after delay seconds on the frame's
+        event loop. Returns an asyncio.TimerHandle.
+        """
+        return self._running_loop().call_later(delay, self._run_guarded, callback, *args)
+
+    def create_task(self, coroutine):
+        """Run coroutine as a task on the frame's event loop.
+
+        Exceptions raised by the task stop the frame.
+        """
+        task = self._running_loop().create_task(coroutine)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _running_loop(self):
+        # callbacks can be scheduled before the frame starts from
+        # code already running on the loop it'll use
+        if self._loop is None:
+            try:
+                return asyncio.get_running_loop()
+            except RuntimeError:
+                raise RuntimeError("frame isn't running an event loop; see start_frame_async",
+                                   self) from None
+        return self._loop
+
+    def _watch_input(self, loop):
+        # returns the file descriptor being watched, or None if input
+        # is polled for instead
+        if isinstance(self._screen, Screen):
+            fd = sys.stdin.fileno()
+            try:
+                loop.add_reader(fd, self._run_guarded, self._read_input)
+                return fd
+            except (NotImplementedError, OSError):
+                # windows event loops can't watch the console, nor
+                # can any loop watch stdin redirected from a file
+                pass
+        self._poll_input()
+        return None
+
+    def _poll_input(self):
+        count = self._run_guarded(self._read_input)
+        # keep going straight away while input is arriving
+        interval = 0 if count else INPUT_POLL_INTERVAL
+        if self._loop is not None:
+            self._input_poll = self._loop.call_later(interval, self._poll_input)
+
+    def _read_input(self):
+        # dispatch all the events waiting; painting is left until
+        # they've all been handled. Returns the number of events.
+        count = 0
+        while True:
+            try:
+                event = self._screen.get_event()
+            except Exception:
+                # input has ended; show what the events so far did
+                if count:
+                    self._paint()
+                raise
+            if event is None:
+                return count
+            self._dispatch_event(event)
+            count += 1
+
+    def _request_paint(self):
+        if not self._paint_requested and self._needs_paint():
+            self._paint_requested = True
+            delay = self._paint_delay()
+            if delay > 0:
+                self._loop.call_later(delay, self._run_guarded, self._requested_paint)
+            else:
+                self._loop.call_soon(self._run_guarded, self._requested_paint)
+
+    def _requested_paint(self):
+        self._paint_requested = False
+        self._paint()
+
+    def _run_guarded(self, callback, *args):
+        # exceptions in callbacks would otherwise only be logged by
+        # asyncio; stop the frame with them instead, as "start_frame"
+        # would
+        try:
+            return callback(*args)
+        except Exception as error:
+            self._stop_loop(error)
+            return None
+
+    def _task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self._stop_loop(task.exception())
+
+    def _stop_loop(self, error):
+        done = self._loop_done
+        if done is None:
+            raise error
+        if not done.done():
+            done.set_exception(error)
+
+    #### other threads ################################################
+
+    # Sheets must only be changed from the thread running the frame.
+    # Other threads post callbacks that make their changes; the frame
+    # runs them the next time round its event loop, then paints.
+
+    def post(self, callback, *args, key=None):
+        """Arrange for callback(*args) to be called by the frame's
+        thread. Can be called from any thread.
+
+        Posting with the same key as a callback that hasn't been run
+        yet replaces that callback, so a worker sending a stream of
+        values for one widget only causes the latest to be shown:
+
+            frame.post(label.set_label_text, text, key=label)
+
+        Invalidating sheets from other threads posts the
+        invalidation automatically.
+        """
+        with self._posted_lock:
+            self._posted[object() if key is None else key] = (callback, args)
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+            loop = self._loop
+            if loop is not None:
+                loop.call_soon_threadsafe(self._run_guarded, self._run_posted)
+            elif self._wake_pipe is not None:
+                try:
+                    os.write(self._wake_pipe[1], b"x")
+                except BlockingIOError:
+                    # the frame has plenty of wake ups waiting
+                    pass
+
+    def _run_posted(self):
+        with self._posted_lock:
+            posted = self._posted
+            self._posted = dict()
+            self._wake_pending = False
+            if self._wake_pipe is not None:
+                try:
+                    while os.read(self._wake_pipe[0], 512):
+                        pass
+                except BlockingIOError:
+                    pass
+        for (callback, args) in posted.values():
+            callback(*args)
+
+    #### key commands ################################################
+
+    # Commands can be bound to single keys or to sequences of keys,
+    # "C-x C-s" style; see "register_command". The command tables of
+    # the focus context are resolved into a single lookup that is
+    # cached per tuple of table names, so moving the focus between
+    # sheets using the same tables doesn't resolve them again. The
+    # frame dispatches the first key of every sequence and its own
+    # single key commands from that lookup; widgets apply the single
+    # key commands in their own tables from "handle_key_event" since
+    # they filter and forward keys as they do so.
+
+    def _command_layers(self, focus_top_level):
+        # [(command table, client)] searched in the same order as
+        # single keys are: global, then the top level, then the focus
+        # and its parents
+        layers = [("global", self)]
+        if focus_top_level is not None:
+            layers.append((focus_top_level.command_table(), focus_top_level))
+        sheet = self._focus
+        while sheet is not None and sheet is not focus_top_level:
+            layers.append((sheet.command_table(), sheet))
+            sheet = sheet._parent
+        return [(table, client) for (table, client) in layers if table is not None]
+
+    def _command_entries(self, key, focus_top_level):
+        # [(command or keymap, client)] bound to key in the focus
+        # context, in search order
+        layers = self._command_layers(focus_top_level)
+        resolved = self._resolved_keymap(tuple(table for (table, client) in layers))
+        return [(entry, layers[index][1]) for (entry, index) in resolved.get(key, ())]
+
+    def _resolved_keymap(self, tables):
+        # key -> [(command or keymap, index into tables)]
+        if self._keymaps_version != keymap_version():
+            self._keymaps_version = keymap_version()
+            self._resolved_keymaps = dict()
+        resolved = self._resolved_keymaps.get(tables)
+        if resolved is None:
+            resolved = dict()
+            for (index, table) in enumerate(tables):
+                for (key, entry) in command_keymap(table).items():
+                    resolved.setdefault(key, []).append((entry, index))
+            self._resolved_keymaps[tables] = resolved
+        return resolved
+
+    def _handle_key_sequence(self, event, entries):
+        # returns True or False if event was dealt with as part of a
+        # key sequence and None if it should be handled as usual
+        if self._key_sequence is not None:
+            keymaps = self._key_sequence
+            self._key_sequence = None
+            if perf_counter() <= self._key_sequence_deadline:
+                return self._continue_key_sequence(keymaps, event.key_code)
+            logger.debug("key sequence timed out")
+        if not entries or not isinstance(entries[0][0], Keymap):
+            return None
+        self._start_key_sequence(entries)
+        return True
+
+    def _continue_key_sequence(self, keymaps, key):
+        entries = []
+        for (keymap, client) in keymaps:
+            entry = keymap.get(key)
+            if entry is not None:
+                entries.append((entry, client))
+        if not entries:
+            # not a command; the keys typed are dropped as emacs does
+            logger.debug("key %s doesn't complete a key sequence", key)
+            return True
+        (entry, client) = entries[0]
+        if isinstance(entry, Command):
+            logger.debug("key sequence command %s for %s", entry, client)
+            entry.apply(client)
+            return True
+        self._start_key_sequence(entries)
+        return True
+
+    def _start_key_sequence(self, entries):
+        self._key_sequence = [(entry, client) for (entry, client) in entries
+                              if isinstance(entry, Keymap)]
+        self._key_sequence_deadline = perf_counter() + KEY_SEQUENCE_TIMEOUT
 
     #### focus #########################################################
 
@@ -438,7 +1050,6 @@ class Frame():
         if self._focus is not None:
             self._focus.note_focus_in()
             self._focus.invalidate()
-        self._process_event()
 
     def _get_focus_top_level(self):
         focus_top_level = self._top_level_sheet
@@ -523,39 +1134,32 @@ class Frame():
         # chars in it. Developer should create a related label that
         # can provide an accelerator instead and display it somewhere
         # in the ui.
-        base_set = [x for x in label if x.isalpha()]
-        if len(base_set)>0:
-            accelerator = self.accelerator_from_label(label, widget.top_level_sheet())
-            if accelerator is not None:
-                self.accelerator_table(widget)[accelerator] = widget
+        top_level = widget.top_level_sheet()
+        accelerator = top_level._widget_to_accelerator.get(widget)
+        if accelerator is not None:
+            if _accelerator_allowed(accelerator, label):
+                # already has one
+                return
+            # the label has changed since the accelerator was found
+            self.discard_accelerator(widget)
+        accelerator = self.accelerator_from_label(label, top_level)
+        if accelerator is not None:
+            top_level._accelerator_to_widget[accelerator] = widget
+            top_level._widget_to_accelerator[widget] = accelerator
 
     def discard_accelerator(self, widget):
-        accelerator = self.accelerator_for_widget(widget)
+        top_level = widget.top_level_sheet()
+        accelerator = top_level._widget_to_accelerator.pop(widget, None)
         if accelerator is not None:
-            del self.accelerator_table(widget)[accelerator]
+            del top_level._accelerator_to_widget[accelerator]
 
     def accelerator_for_widget(self, widget):
-        for key, value in self.accelerator_table(widget).items():
-            if value == widget:
-                return key
-        return None
+        return widget.top_level_sheet()._widget_to_accelerator.get(widget)
 
     def accelerator_from_label(self, label, top_level):
-        # check first char of words first
-        accel_candidates = ""
-        for c in [x[0] for x in label.split()]:
-            if c.isalpha() and c not in accel_candidates:
-                accel_candidates += c
-
-        # add chars from label ignoring non-alpha
-        for c in label:
-            if c.isalpha() and c not in accel_candidates:
-                accel_candidates += c
-
-        for c in accel_candidates:
+        for c in _accelerator_candidates(label):
             if c not in self.accelerator_table(top_level):
-                # reserve O and K (in any case) for ok buttons
-                if c in "OoKk" and label.casefold() != "ok".casefold():
+                if not _accelerator_allowed(c, label):
                     continue
                 logger.debug("Found accelerator %s for label %s", c, label)
                 return c
@@ -563,3 +1167,49 @@ class Frame():
         # an accelerator instead of just failing?
         # raise RuntimeError("Ran out of accelerators for label", label)
         return None
+
+
+# labels are registered every time their sheet is attached so their
+# candidates are cached; the size of the cache is bounded since labels
+# can be built from data
+@lru_cache(maxsize=256)
+def _accelerator_candidates(label):
+    # alpha chars of the label, first chars of words first, without
+    # repeats
+    candidates = ""
+    for c in [x[0] for x in label.split()]:
+        if c.isalpha() and c not in candidates:
+            candidates += c
+    for c in label:
+        if c.isalpha() and c not in candidates:
+            candidates += c
+    return candidates
+
+
+def _accelerator_allowed(accelerator, label):
+    # reserve O and K (in any case) for ok buttons
+    if accelerator in "OoKk" and label.casefold() != "ok".casefold():
+        return False
+    return accelerator in _accelerator_candidates(label)
+
+
+def _note_redrawn_by(sheet, ancestor):
+    # sheet is invalidated but will be redrawn when ancestor is
+    # rendered; tell the sheets in between, some of which may keep
+    # their descendants' drawing rather than rendering them again
+    parent = sheet._parent
+    while True:
+        parent.note_descendant_invalidated(sheet)
+        if parent is ancestor:
+            return
+        parent = parent._parent
+
+
+def _is_ancestor(ancestor, sheet):
+    # true if "ancestor" is a strict ancestor of "sheet"
+    parent = sheet._parent
+    while parent is not None:
+        if parent is ancestor:
+            return True
+        parent = parent._parent
+    return False
@@ -185,6 +185,7 @@ class FrameManager():
         },
         "optionbox": {
             "default": {
+                "pen": Pen(Screen.COLOUR_BLACK, Screen.A_NORMAL, Screen.COLOUR_CYAN, ' '),
                 "accelerator": Pen(Screen.COLOUR_RED, Screen.A_BOLD, Screen.COLOUR_CYAN, ' ')
             }
         },
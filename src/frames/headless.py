@@ -0,0 +1,172 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import deque
+from time import sleep
+
+from asciimatics.event import KeyboardEvent, MouseEvent
+from asciimatics.exceptions import StopApplication
+
+from dcs.cellbuffer import CellBuffer
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class HeadlessScreen():
+    """In-memory stand in for an asciimatics Screen.
+
+    Provides the parts of the Screen interface used by Frame and its
+    compositor, drawing into a grid of cells instead of a terminal so
+    applications can be run without a TTY, e.g. to measure throughput
+    or to compare what's drawn before and after a change.
+
+    Input comes from a queue of scripted events. Once the queue is
+    empty "get_event" raises StopApplication, which ends the frame's
+    event loop, unless stop_when_idle is False in which case it
+    returns None like a real screen with no input waiting.
+
+        screen = HeadlessScreen(width=80, height=24)
+        screen.add_key(Screen.KEY_TAB)
+        screen.add_text("hello")
+        try:
+            demo(screen)
+        except StopApplication:
+            pass
+        print(screen.text())
+    """
+    def __init__(self, width=80, height=24, events=None, stop_when_idle=True):
+        self.width = width
+        self.height = height
+        self._cells = CellBuffer(width, height)
+        self._events = deque(() if events is None else events)
+        self._stop_when_idle = stop_when_idle
+        # drawing cursor for "move" and "draw"
+        self._x = 0
+        self._y = 0
+        # counts of the work done, for benchmarks
+        self._print_calls = 0
+        self._cells_written = 0
+        self._refreshes = 0
+
+    def __repr__(self):
+        return "HeadlessScreen({}x{}, {} events queued)".format(self.width, self.height,
+                                                               len(self._events))
+
+    @property
+    def dimensions(self):
+        # same order as asciimatics
+        return (self.height, self.width)
+
+    #####                                                   INPUT #
+
+    def add_event(self, event):
+        self._events.append(event)
+
+    def add_key(self, key_code):
+        self._events.append(KeyboardEvent(key_code))
+
+    def add_text(self, text):
+        for char in text:
+            self._events.append(KeyboardEvent(ord(char)))
+
+    def add_click(self, x, y, buttons=MouseEvent.LEFT_CLICK):
+        self._events.append(MouseEvent(x, y, buttons))
+
+    def pending_events(self):
+        return len(self._events)
+
+    def wait_for_input(self, timeout):
+        # input is always available, or never will be unless the
+        # screen is kept running when idle; then it waits like a
+        # terminal with nothing typed so idle frames don't spin
+        if not self._events and not self._stop_when_idle:
+            sleep(timeout)
+
+    def get_event(self):
+        if self._events:
+            return self._events.popleft()
+        if self._stop_when_idle:
+            raise StopApplication("headless input exhausted")
+        return None
+
+    def has_resized(self):
+        return False
+
+    #####                                                   OUTPUT #
+
+    def print_at(self, text, x, y, colour=7, attr=0, bg=0, transparent=False):
+        self._print_calls += 1
+        self._cells_written += len(text)
+        self._cells.print_at(text, x, y, colour, attr, bg)
+
+    def move(self, x, y):
+        self._x = x
+        self._y = y
+
+    def draw(self, x, y, char=None, colour=7, bg=0, thin=False):
+        # only straight lines; the end point isn't drawn
+        char = u'█' if char is None else char
+        if x == self._x:
+            for line_y in range(min(y, self._y), max(y, self._y)):
+                self.print_at(char, x, line_y, colour, 0, bg)
+        else:
+            for line_x in range(min(x, self._x), max(x, self._x)):
+                self.print_at(char, line_x, y, colour, 0, bg)
+        self._x = x
+        self._y = y
+
+    def clear(self):
+        self._cells.fill(0, 0, self.width, self.height, ' ', 7, 0, 0)
+
+    def refresh(self):
+        self._refreshes += 1
+
+    def close(self, restore=True):
+        pass
+
+    #####                                                   INSPECTION #
+
+    def get_from(self, x, y):
+        """Return (char code, fg, attr, bg) for the cell at x, y.
+
+        Returns None if the position is off the screen.
+        """
+        cell = self._cells.get(x, y)
+        if cell is None:
+            return None
+        (char, fg, attr, bg) = cell
+        return (ord(char), fg, attr, bg)
+
+    def row_text(self, y):
+        return "".join(self._cells.get(x, y)[0] for x in range(self.width))
+
+    def text(self):
+        """Return the characters on the screen, one line per row."""
+        return "\n".join(self.row_text(y) for y in range(self.height))
+
+    def stats(self):
+        """Return counts of the output calls made so far."""
+        return {
+            "print_calls": self._print_calls,
+            "cells_written": self._cells_written,
+            "refreshes": self._refreshes,
+        }
+
+    def reset_stats(self):
+        self._print_calls = 0
+        self._cells_written = 0
+        self._refreshes = 0
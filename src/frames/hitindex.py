@@ -0,0 +1,152 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from geometry.transforms import Transform
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# More changed rectangles than this and the whole grid is rebuilt
+# rather than each rectangle being indexed again
+MAX_DAMAGE = 8
+
+class HitIndex():
+    """Index of the sheets under each screen cell of a top level sheet.
+
+    The index is a grid with one entry per cell covered by the top
+    level sheet. Each entry is the sheet highest in the z-order whose
+    "hit_region" contains the cell, clipped to its ancestors'
+    regions, together with the sheet's offset from the screen. This
+    gives the same answer as "find_highest_sheet_containing_position"
+    but finding the sheet under the mouse is a single lookup.
+
+    Sheets in the top level that are moved, laid out, attached or
+    detached report the screen rectangles they covered and now cover
+    with "note_damage"; only the cells in those rectangles are indexed
+    again the next time the grid is used. The grid is rebuilt from the
+    whole sheet tree when the top level is allocated space or moved.
+    """
+    def __init__(self, top_level):
+        self._top_level = top_level
+        # False until the grid is built and after "invalidate"
+        self._valid = False
+        # screen ltrbs changed since the grid was last used
+        self._damage = []
+        # screen ltrb covered by the grid
+        self._ltrb = (0, 0, 0, 0)
+        # row-major list of (sheet, dx, dy) or None
+        self._cells = []
+
+    def __repr__(self):
+        (l, t, r, b) = self._ltrb
+        return "HitIndex({}x{}@{},{})".format(r-l, b-t, l, t)
+
+    def invalidate(self):
+        self._valid = False
+        self._damage = []
+
+    def note_damage(self, region):
+        # region is in screen coordinates
+        if self._valid:
+            if len(self._damage) < MAX_DAMAGE:
+                self._damage.append(region.ltrb())
+            else:
+                self.invalidate()
+
+    def sheet_at(self, x, y):
+        """Return the sheet at screen position x, y and the transform
+        from screen coordinates to the sheet's coordinates.
+
+        Returns (None, None) if no sheet in the top level contains
+        the position.
+        """
+        if not self._valid or self._ltrb != self._top_level_ltrb():
+            self._rebuild()
+        elif self._damage:
+            self._repair()
+        (l, t, r, b) = self._ltrb
+        if not (l <= x < r and t <= y < b):
+            return (None, None)
+        entry = self._cells[(y-t)*(r-l) + (x-l)]
+        if entry is None:
+            return (None, None)
+        (sheet, dx, dy) = entry
+        return (sheet, Transform(-dx, -dy))
+
+    def _top_level_ltrb(self):
+        top_level = self._top_level
+        if top_level._region is None:
+            return (0, 0, 0, 0)
+        (l, t, r, b) = top_level._region.ltrb()
+        (dx, dy) = (top_level._transform._dx, top_level._transform._dy)
+        return (l+dx, t+dy, max(r+dx, l+dx), max(b+dy, t+dy))
+
+    def _rebuild(self):
+        self._valid = True
+        self._damage = []
+        self._ltrb = self._top_level_ltrb()
+        (l, t, r, b) = self._ltrb
+        self._cells = [None] * ((r-l) * (b-t))
+        if self._top_level._region is not None:
+            self._index_sheet(self._top_level, 0, 0, self._ltrb)
+
+    def _repair(self):
+        # clear each changed rectangle then index the sheets in it
+        # again, clipped to it
+        (grid_l, grid_t, grid_r, grid_b) = self._ltrb
+        for (l, t, r, b) in self._damage:
+            clip = (max(l, grid_l), max(t, grid_t), min(r, grid_r), min(b, grid_b))
+            if clip[0] < clip[2] and clip[1] < clip[3]:
+                self._fill(*clip, None)
+                self._index_sheet(self._top_level, 0, 0, clip)
+        self._damage = []
+
+    def _index_sheet(self, sheet, dx, dy, clip):
+        # sheets are indexed lowest in the z-order first so higher
+        # sheets overwrite them. dx, dy is the screen offset of the
+        # sheet's parent and clip the screen ltrb of the parent's
+        # region clipped by its ancestors.
+        region = sheet._region
+        if region is None:
+            return
+        dx += sheet._transform._dx
+        dy += sheet._transform._dy
+        (l, t, r, b) = region.ltrb()
+        clip = (max(clip[0], l+dx), max(clip[1], t+dy),
+                min(clip[2], r+dx), min(clip[3], b+dy))
+        if clip[0] >= clip[2] or clip[1] >= clip[3]:
+            # children are only hit if the sheet is
+            return
+        hit_region = sheet.hit_region()
+        if hit_region is not None:
+            (l, t, r, b) = hit_region.ltrb()
+            self._fill(max(clip[0], l+dx), max(clip[1], t+dy),
+                       min(clip[2], r+dx), min(clip[3], b+dy),
+                       (sheet, dx, dy))
+        for child in sheet.hit_children():
+            self._index_sheet(child, dx, dy, clip)
+
+    def _fill(self, left, top, right, bottom, entry):
+        if left >= right or top >= bottom:
+            return
+        (grid_left, grid_top, grid_right, _) = self._ltrb
+        width = grid_right - grid_left
+        row = [entry] * (right-left)
+        cells = self._cells
+        for y in range(top, bottom):
+            start = (y-grid_top)*width + (left-grid_left)
+            cells[start:start+len(row)] = row
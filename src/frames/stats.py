@@ -0,0 +1,177 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import deque
+from time import perf_counter
+from weakref import WeakKeyDictionary
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# stats object being recorded into, if any. Sheets can't cheaply find
+# their frame when looking up pens so pen lookups are counted via
+# this.
+_recording = None
+
+def recording_stats():
+    return _recording
+
+
+def set_recording_stats(stats):
+    global _recording
+    _recording = stats
+
+
+class FrameStats():
+    """Measurements of the work done by a frame.
+
+    Recorded by a frame once "Frame.enable_stats" has been called:
+
+      + event-to-paint latency; the time from the frame receiving an
+      event to the changes it caused reaching the screen;
+
+      + layout time;
+
+      + paint time; the time taken to redraw the invalidated sheets
+      and damaged areas and send the changes to the screen;
+
+      + render time per sheet, including the sheet's children;
+
+      + paints, draw calls, cells written and pen lookups.
+
+    Timings are in seconds. Only the most recent "history" latencies,
+    layout times and paint times are kept.
+    """
+    def __init__(self, history=256):
+        self._latencies = deque(maxlen=history)
+        self._layout_times = deque(maxlen=history)
+        # times of recent paints, for fps, and how long they took
+        self._paint_times = deque(maxlen=history)
+        self._paint_durations = deque(maxlen=history)
+        # sheet -> [renders, total seconds]
+        self._render_times = WeakKeyDictionary()
+        self._events = 0
+        self._paints = 0
+        self._draw_calls = 0
+        self._cells_written = 0
+        self._pen_lookups = 0
+
+    def __repr__(self):
+        return "FrameStats({} events, {} paints)".format(self._events, self._paints)
+
+    def reset(self):
+        self.__init__(history=self._latencies.maxlen)
+
+    #####                                                   RECORDING #
+
+    def record_latency(self, seconds):
+        self._events += 1
+        self._latencies.append(seconds)
+
+    def record_layout(self, seconds):
+        self._layout_times.append(seconds)
+
+    def record_render(self, sheet, seconds):
+        entry = self._render_times.get(sheet)
+        if entry is None:
+            self._render_times[sheet] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def record_paint(self, seconds):
+        self._paints += 1
+        self._paint_times.append(perf_counter())
+        self._paint_durations.append(seconds)
+
+    def note_draw(self, cells):
+        self._draw_calls += 1
+        self._cells_written += cells
+
+    def note_pen_lookup(self):
+        self._pen_lookups += 1
+
+    #####                                                   RESULTS #
+
+    def events(self):
+        return self._events
+
+    def paints(self):
+        return self._paints
+
+    def draw_calls(self):
+        return self._draw_calls
+
+    def cells_written(self):
+        return self._cells_written
+
+    def pen_lookups(self):
+        return self._pen_lookups
+
+    def fps(self):
+        """Return the number of paints in the last second."""
+        now = perf_counter()
+        return sum(1 for paint_time in self._paint_times if now-paint_time <= 1.0)
+
+    def latency_percentile(self, percent):
+        return _percentile(self._latencies, percent)
+
+    def layout_percentile(self, percent):
+        return _percentile(self._layout_times, percent)
+
+    def paint_percentile(self, percent):
+        return _percentile(self._paint_durations, percent)
+
+    def sheet_render_times(self):
+        """Return (sheet, renders, seconds) tuples, slowest first."""
+        times = [(sheet, renders, seconds)
+                 for (sheet, (renders, seconds)) in self._render_times.items()]
+        return sorted(times, key=lambda entry: entry[2], reverse=True)
+
+    def summary(self):
+        """Return the headline figures as a dict."""
+        return {
+            "events": self._events,
+            "paints": self._paints,
+            "fps": self.fps(),
+            "latency_p50": self.latency_percentile(50),
+            "latency_p99": self.latency_percentile(99),
+            "layout_p50": self.layout_percentile(50),
+            "paint_p50": self.paint_percentile(50),
+            "paint_p99": self.paint_percentile(99),
+            "draw_calls": self._draw_calls,
+            "cells_written": self._cells_written,
+            "pen_lookups": self._pen_lookups,
+        }
+
+    def overlay_text(self):
+        # event latency and paint time p50/p99 in milliseconds; fixed
+        # width so the overlay always covers the same cells
+        figures = [self.latency_percentile(50), self.latency_percentile(99),
+                   self.paint_percentile(50), self.paint_percentile(99)]
+        figures = [0.0 if seconds is None else seconds*1000 for seconds in figures]
+        return "{:3d} fps latency {:5.1f}/{:5.1f}ms paint {:5.1f}/{:5.1f}ms".format(
+            self.fps(), *figures)
+
+
+def _percentile(samples, percent):
+    # nearest rank; None if there are no samples
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered)-1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,133 @@
+#
+# Copyright 2022 Duncan Rose
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from dcs.ink import Pen
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+class Theme():
+    """Compiled pen table.
+
+    Built from a nested "role" -> "state" -> "pen" dictionary, such as
+    FrameManager.THEMES. Every combination of the roles, states and
+    pen names found in the dictionary is resolved up front, including
+    the fallbacks:
+
+      + roles that aren't found use role "undefined";
+
+      + states that aren't found for the role use state "default";
+
+      + pens that aren't found for the role and state are looked for
+      in the role's "default" state, and if not found there, the
+      role's "default" "pen" is used.
+
+    Pens with the same colours, attributes and fill are shared.
+
+    Missing entries that would cause lookups to fail are reported once
+    when the theme is compiled; see "problems".
+    """
+    def __init__(self, pens, overrides=None):
+        # overrides are merged over the top of pens; both have the
+        # same structure
+        self._pens = _merge_pen_dicts(pens, overrides)
+        self._roles = frozenset(self._pens)
+        self._states = frozenset(state
+                                 for states in self._pens.values()
+                                 for state in states)
+        self._pen_names = frozenset(name
+                                    for states in self._pens.values()
+                                    for names in states.values()
+                                    for name in names)
+        self._problems = self._validate()
+        # applications check "problems"; logging louder than debug
+        # would be written over the top of the screen
+        for problem in self._problems:
+            logger.debug("Theme: %s", problem)
+        self._table = self._compile()
+
+    def __repr__(self):
+        return "Theme({} roles, {} pens)".format(len(self._roles), len(self._table))
+
+    def problems(self):
+        """Return descriptions of the entries missing from the theme."""
+        return list(self._problems)
+
+    def pen(self, role, state, pen):
+        try:
+            return self._table[(role, state, pen)]
+        except KeyError:
+            pass
+        # names not mentioned anywhere in the theme always fall back
+        # the same way
+        if role not in self._roles:
+            role = "undefined"
+        if state not in self._states:
+            state = "default"
+        if pen not in self._pen_names:
+            pen = "pen"
+        try:
+            return self._table[(role, state, pen)]
+        except KeyError:
+            raise KeyError(f"Failed to find theme[{role}][{state}][{pen}]")
+
+    def _validate(self):
+        problems = []
+        if "undefined" not in self._pens:
+            problems.append("no 'undefined' role; pens for unknown roles can't be found")
+        for role, states in self._pens.items():
+            if "default" not in states:
+                problems.append(f"role '{role}' has no 'default' state")
+            elif "pen" not in states["default"]:
+                problems.append(f"role '{role}' has no 'default' 'pen'")
+        return problems
+
+    def _compile(self):
+        interned = dict()
+        table = dict()
+        states = self._states | {"default"}
+        pen_names = self._pen_names | {"pen"}
+        for role in self._roles:
+            for state in states:
+                for name in pen_names:
+                    pen = self._resolve(role, state, name)
+                    if pen is None:
+                        continue
+                    key = (pen.fg(), pen.attr(), pen.bg(), pen.fill())
+                    table[(role, state, name)] = interned.setdefault(key, pen)
+        return table
+
+    def _resolve(self, role, state, pen):
+        # the fallback rules; returns None if the pen can't be found
+        states = self._pens[role]
+        if state not in states:
+            state = "default"
+        if pen not in states.get(state, ()):
+            state = "default"
+            if pen not in states.get(state, ()):
+                pen = "pen"
+        return states.get(state, {}).get(pen)
+
+
+def _merge_pen_dicts(pens, overrides):
+    merged = {role: {state: dict(names) for state, names in states.items()}
+              for role, states in pens.items()}
+    if overrides is not None:
+        for role, states in overrides.items():
+            for state, names in states.items():
+                merged.setdefault(role, dict()).setdefault(state, dict()).update(names)
+    return merged
@@ -15,7 +15,12 @@
 #
 
 class Point:
-    """Singular point"""
+    """Singular point
+
+    Points are never changed once made; transforming a point returns
+    a new one.
+    """
+    __slots__ = ("_x", "_y")
 
     def __init__(self, x, y):
         self._x=x
@@ -15,7 +15,12 @@
 #
 
 class Region:
-    """Rectangular region"""
+    """Rectangular region
+
+    Regions are never changed once made; operations on them return
+    new regions.
+    """
+    __slots__ = ("_left", "_top", "_right", "_bottom")
 
     def __init__(self, left, top, right, bottom):
         self._left=left
@@ -34,6 +39,10 @@ class Region:
         return self._left <= cx < self._right \
             and self._top <= cy < self._bottom
 
+    def region_contains_xy(self, x, y):
+        # as region_contains_position without needing a Point
+        return self._left <= x < self._right and self._top <= y < self._bottom
+
     def region_intersects_region(self, region):
         (l2, t2, r2, b2) = region.ltrb()
         return (self._left <= l2 < self._right or self._left < r2 <= self._right) \
@@ -47,3 +56,49 @@ class Region:
 
     def ltrb(self):
         return (self._left, self._top, self._right, self._bottom)
+
+    def region_intersection(self, region):
+        # returns the overlap of the two regions, or None if they
+        # don't overlap at all
+        left = max(self._left, region._left)
+        top = max(self._top, region._top)
+        right = min(self._right, region._right)
+        bottom = min(self._bottom, region._bottom)
+        if left >= right or top >= bottom:
+            return None
+        return Region(left, top, right, bottom)
+
+    def region_union(self, region):
+        # smallest region containing both regions
+        (l2, t2, r2, b2) = region.ltrb()
+        return Region(min(self._left, l2), min(self._top, t2),
+                      max(self._right, r2), max(self._bottom, b2))
+
+    def region_is_empty(self):
+        return self._right <= self._left or self._bottom <= self._top
+
+
+def merge_regions(regions):
+    """Merge overlapping regions.
+
+    Returns a list of regions covering every non-empty region passed
+    in where no two of the returned regions overlap. Regions that
+    overlap are replaced by their union.
+    """
+    merged = []
+    for region in regions:
+        if region.region_is_empty():
+            continue
+        # merging may grow the region so it overlaps regions already
+        # checked; keep going until nothing else overlaps it
+        overlapped = True
+        while overlapped:
+            overlapped = False
+            for other in merged:
+                if region.region_intersection(other) is not None:
+                    merged.remove(other)
+                    region = region.region_union(other)
+                    overlapped = True
+                    break
+        merged.append(region)
+    return merged
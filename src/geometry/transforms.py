@@ -17,30 +17,80 @@
 from geometry.regions import Region
 from geometry.points import Point
 
+# Bumped whenever a sheet is moved, laid out or attached / detached.
+# Anything derived from where sheets are on the screen (e.g. hit-test
+# indexes) is out of date when this changes.
+_geometry_version = 0
+
+def geometry_version():
+    return _geometry_version
+
+def note_geometry_changed():
+    global _geometry_version
+    _geometry_version += 1
+
 class Transform:
-    """Transform coordinates by a translation."""
+    """Transform coordinates by a translation.
+
+    Transforms are never changed once made. There's only one no-op
+    transform; Transform(0, 0) returns IDENTITY_TRANSFORM, and
+    transforming by it returns the point or region unchanged.
+    """
+    __slots__ = ("_dx", "_dy", "_inverse")
 
-    def __init__(self, dx, dy):
-        self._dx = dx
-        self._dy = dy
+    def __new__(cls, dx, dy):
+        if dx == 0 and dy == 0 and IDENTITY_TRANSFORM is not None:
+            return IDENTITY_TRANSFORM
+        transform = super().__new__(cls)
+        transform._dx = dx
+        transform._dy = dy
+        # made on first use
+        transform._inverse = None
+        return transform
 
     def __repr__(self):
         return "Transform({},{})".format(self._dx, self._dy)
 
     def inverse(self):
-        return Transform(-self._dx, -self._dy)
+        inverse = self._inverse
+        if inverse is None:
+            inverse = Transform(-self._dx, -self._dy)
+            inverse._inverse = self
+            self._inverse = inverse
+        return inverse
+
+    def is_identity(self):
+        return self is IDENTITY_TRANSFORM
 
     def add_transform(self, other):
+        if other is IDENTITY_TRANSFORM:
+            return self
+        if self is IDENTITY_TRANSFORM:
+            return other
         return Transform(self._dx + other._dx, self._dy + other._dy)
 
+    def transform_xy(self, x, y):
+        # as transform_point for callers that have plain coordinates
+        return (x + self._dx, y + self._dy)
+
+    def transform_ltrb(self, left, top, right, bottom):
+        # as transform_region for callers that have plain coordinates
+        (dx, dy) = (self._dx, self._dy)
+        return (left + dx, top + dy, right + dx, bottom + dy)
+
     def transform_point(self, point):
-        return Point(point.point_x() + self._dx, point.point_y() + self._dy)
+        if self is IDENTITY_TRANSFORM:
+            return point
+        return Point(point._x + self._dx, point._y + self._dy)
 
     def transform_region(self, region):
-        (l, t, r, b) = region.ltrb()
-        (l, t) = self.transform_point(Point(l, t)).xy()
-        (r, b) = self.transform_point(Point(r, b)).xy()
-        return Region(l, t, r, b)
+        if self is IDENTITY_TRANSFORM:
+            return region
+        (dx, dy) = (self._dx, self._dy)
+        return Region(region._left + dx, region._top + dy,
+                      region._right + dx, region._bottom + dy)
 
 # no-op transform
+IDENTITY_TRANSFORM = None
 IDENTITY_TRANSFORM = Transform(0, 0)
+IDENTITY_TRANSFORM._inverse = IDENTITY_TRANSFORM
@@ -124,6 +124,11 @@ class BorderLayout(Sheet):
         # this sheet doesn't contain the position
         return None
 
+    # scroll bars aren't children but are above them in the z-order
+    def hit_children(self):
+        bars = [bar for bar in [self._horizontal_sb, self._vertical_sb] if bar is not None]
+        return self._children + bars if bars else self._children
+
     def attach(self):
         super().attach()
         if self._horizontal_sb is not None:
@@ -140,7 +145,7 @@ class BorderLayout(Sheet):
 
     # Ask children how much space it needs, add in the border, use
     # that as the space request
-    def compose_space(self):
+    def _compose_space(self):
         sr = SpaceReq(1, 10, FILL, 1, 10, FILL)
         # Border layout has single child
         for child in self._children:
@@ -209,8 +214,7 @@ class BorderLayout(Sheet):
             raise RuntimeError("render invoked before space allocation")
         self.clear(self._region)
         self._draw_border()
-        for child in self._children:
-            child.render()
+        self.render_children()
         if self._vertical_sb is not None:
             self._vertical_sb.render()
         if self._horizontal_sb is not None:
@@ -178,8 +178,7 @@ class BoxLayout(Sheet):
         # default background colour.
         # fixme: which pen to use for clearing the region?
         self.clear(self._region)
-        for child in self._children:
-            child.render()
+        self.render_children()
 
 
 class HorizontalLayout(BoxLayout):
@@ -198,7 +197,7 @@ class HorizontalLayout(BoxLayout):
                 self._region.region_height(),
                 tx, ty, len(self._portions))
 
-    def compose_space(self):
+    def _compose_space(self):
         min_height = 1
         preferred_height = 1
         min_width = 0
@@ -248,7 +247,7 @@ class VerticalLayout(BoxLayout):
                 self._region.region_width(),
                 self._region.region_height(), tx, ty, len(self._portions))
 
-    def compose_space(self):
+    def _compose_space(self):
         min_height = 1
         preferred_height = 1
         min_width = 0
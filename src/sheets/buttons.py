@@ -80,24 +80,30 @@ class Button(Sheet):
     # Deny containing position if not over actual button (i.e.,
     # consider padding and shadow to be outside the sheet)
     def find_highest_sheet_containing_position(self, parent_coord, log_indent="  "):
-        coord = self._transform.inverse().apply(parent_coord)
-        if self.region_contains_position(coord):
-            (x, y) = coord
+        coord = self._transform.inverse().transform_point(parent_coord)
+        if self._region.region_contains_position(coord):
             # Is the mouse over the button background?
-            (l, t, r, b) = self._button_background_region()
             # fixme: "r" seems to include the shadow on the
             # rhs. Investigate
-            if l <= x < r and t <= y < b:
+            if self._button_background_region().region_contains_position(coord):
                 return self
         return None
 
+    # only the button background responds to the mouse, and the
+    # label is part of the button
+    def hit_region(self):
+        return self._button_background_region()
+
+    def hit_children(self):
+        return []
+
     ####
 
     # default button expects to be able to fit its label + some
     # padding. It can grow as big as you like, but won't go smaller
     # than 2x4.  How about dealing with multi-line labels? Image
     # buttons?
-    def compose_space(self):
+    def _compose_space(self):
 
         # Undecorated buttons can shrink to 1x1; decorated buttons
         # also, but they retain space for the decoration.
@@ -303,8 +309,11 @@ class Button(Sheet):
                 return self.activate()
         return False
 
+    def command_table(self):
+        return "button"
+
     def handle_key_event(self, event):
-        command = find_command(event, command_table="button")
+        command = find_command(event, command_table=self.command_table())
         if command is not None:
             return command.apply(self)
         return False
@@ -140,7 +140,7 @@ class Dialog(TopLevelSheet):
             okButton.on_click_callback = callback
             return okButton
 
-    def compose_space(self):
+    def _compose_space(self):
         # make sufficient space for:
         # content pane + button pane
         # + border
@@ -236,8 +236,7 @@ class Dialog(TopLevelSheet):
             b -= 1
         self.clear(Region(l, t, r, b), self.pen())
 
-        for child in self._children:
-            child.render()
+        self.render_children()
 
         if self._text is not None:
             pen = self.pen()
@@ -270,6 +269,9 @@ class Dialog(TopLevelSheet):
         # value is included.
         self.draw_to(Point(right, bottom-1), dropshadow_below, shadow_pen)
 
+    def command_table(self):
+        return "dialog"
+
     def handle_key_event(self, key_event):
 
         # this method isn't entered for multivalue dialogs. Not sure
@@ -279,7 +281,7 @@ class Dialog(TopLevelSheet):
         logger.debug("-----> DIALOG :: handle_key_event %s", key_event)
 
         # Try to handle it ourselves
-        command = find_command(key_event, command_table="dialog")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             result = command.apply(self)
             if result:
@@ -335,7 +337,7 @@ class MultivalueDialog(Dialog):
         # dialog
         pass
 
-    def compose_space(self):
+    def _compose_space(self):
         spacereq = None
         # if dialog is a shell it's entire content is defined by
         # the size of its single child
@@ -371,8 +373,7 @@ class MultivalueDialog(Dialog):
             b -= 1
         self.clear(Region(l, t, r, b), self.pen())
 
-        for child in self._children:
-            child.render()
+        self.render_children()
 
         if self._drop_shadow:
             self._draw_dropshadow()
@@ -46,6 +46,9 @@ class Label(Sheet):
                  owner=None):
         super().__init__(owner=owner)
         self._accelerator_char = None
+        # (display text, accelerator char, index of char in text) from
+        # the last render
+        self._accelerator_index_cache = (None, None, -1)
         self._label_text = label_text
         valid_aligns = { None, "left", "right", "center", "centre" }
         if align not in valid_aligns:
@@ -71,6 +74,14 @@ class Label(Sheet):
     def add_child(self):
         raise RuntimeError("children not allowed")
 
+    def set_label_text(self, label_text):
+        # space requirement depends on the length of the text only
+        if len(label_text) != len(self._label_text):
+            self.invalidate_layout()
+        self._label_text = label_text
+        if self.is_attached():
+            self.invalidate()
+
     def render(self):
         state = "default"
         if self._label_widget is not None:
@@ -111,7 +122,11 @@ class Label(Sheet):
         self.clear(self._region, pen)
 
     def _find_index_of_accelerator(self, display_text, accel_char):
-        return display_text.find(accel_char)
+        (text, char, index) = self._accelerator_index_cache
+        if text != display_text or char != accel_char:
+            index = display_text.find(accel_char)
+            self._accelerator_index_cache = (display_text, accel_char, index)
+        return index
 
     def truncate_text_to_width(self, display_text, width):
         """Truncate text to fit widget.
@@ -142,7 +157,7 @@ class Label(Sheet):
             # align == "center" or "centre"
             return (width-len(text)) // 2
 
-    def compose_space(self):
+    def _compose_space(self):
         # Prefer enough room for the label. Can take as much room as offered.
         # Won't shrink below 3 chars from label + "..." (= 6 chars)
         label_min = min(len(self._label_text), 6)
@@ -188,8 +203,11 @@ class ValueLabel(Label, ValueMixin):
         state = "focus" if self.is_focus() else state
         return super().pen(role=role, state=state, pen=pen)
 
+    def command_table(self):
+        return "valuelabel"
+
     def handle_key_event(self, key_event):
-        command = find_command(key_event, command_table="valuelabel")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             return command.apply(self)
         return False
@@ -30,6 +30,8 @@ class ListLayout(Sheet):
     """
     def __init__(self, owner=None):
         super().__init__(owner=owner)
+        # height of the laid out children
+        self._content_height = 0
 
     def __repr__(self):
         (l, t, r, b) = self._region.ltrb()
@@ -41,6 +43,16 @@ class ListLayout(Sheet):
             child.move_to(Point(0, offset))
             offset += child.height()
             child.layout()
+        self._content_height = offset
+
+    def content_extents(self):
+        # the children are packed so the list is as tall as they are,
+        # and as wide as it asks to be if it's given more room than
+        # that
+        if self._region is None:
+            return None
+        width = min(self.compose_space().x_preferred(), self.width())
+        return (width, self._content_height)
 
     # fixme: manipulating children should be done in the Sheet type I
     # think - no need to replicate this logic all over.
@@ -50,6 +62,7 @@ class ListLayout(Sheet):
             # z-order first
             child = self._children.pop()
             child.detach()
+        self.invalidate_layout()
 
     def render(self):
         if not self._region:
@@ -59,8 +72,7 @@ class ListLayout(Sheet):
         # region anyway and they can rely on empty space being the
         # default background colour.
         self.clear(self._region)
-        for child in self._children:
-            child.render()
+        self.render_children()
 
     def allocate_space(self, allocation):
         (l, t, r, b) = allocation.ltrb()
@@ -115,7 +127,7 @@ class ListLayout(Sheet):
             allocated_space += widget_height
 
 
-    def compose_space(self):
+    def _compose_space(self):
         (reqheight, reqwidth, minwidth, minheight) = (0,)*4
         for child in self._children:
             sr = child.compose_space()
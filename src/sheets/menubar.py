@@ -58,8 +58,7 @@ class MenubarLayout(Sheet):
         self.move(Point(left, top))
         self.draw_to(Point(right, top), ' ',
                      self.pen(role="menubar", state="default", pen="pen"))
-        for child in self._children:
-            child.render()
+        self.render_children()
 
     # give each child as much space as they want
     def allocate_space(self, allocation):
@@ -79,7 +78,7 @@ class MenubarLayout(Sheet):
             # fixme: take the minimum of the button?
             child.allocate_space(Region(left, top, left+cw, bottom))
 
-    def compose_space(self):
+    def _compose_space(self):
         return SpaceReq(1, FILL, FILL, 1, 1, 1)
 
     # fixme: add some functions to take a bunch of labels and
@@ -88,8 +87,11 @@ class MenubarLayout(Sheet):
     # events - top level sheets don't pass event on to a parent,
     # instead they return False to indicate the event is not handled
     # and expect the Frame to take any further necessary action
+    def command_table(self):
+        return "menubar"
+
     def handle_key_event(self, key_event):
-        command = find_command(key_event, command_table="menubar")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             return command.apply(self)
         return False
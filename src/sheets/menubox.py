@@ -65,8 +65,7 @@ class MenuBox(TopLevelSheet):
         # don't clear the edges where the dropshadow will be drawn
         (l, t, r, b) = self._region.ltrb()
         self.clear(Region(l, t, r-1, b-1), self.pen())
-        for child in self._children:
-            child.render()
+        self.render_children()
         self._draw_dropshadow()
 
     def _draw_dropshadow(self):
@@ -95,7 +94,7 @@ class MenuBox(TopLevelSheet):
         for child in self._children:
             child.allocate_space(Region(l, t, r-1, b-1))
 
-    def compose_space(self):
+    def _compose_space(self):
         # Sheet hierarchy is:
         #
         # menubox
@@ -130,9 +129,12 @@ class MenuBox(TopLevelSheet):
         # FIXME: not necessary and adds nothing - for now at least.
         return True
 
+    def command_table(self):
+        return "menubox"
+
     def handle_key_event(self, key_event):
         # fixme: do menubox types need widget focus?
-        command = find_command(key_event, command_table="menubox")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             return command.apply(self)
 
@@ -28,6 +28,7 @@ from sheets.dialog import alert
 from sheets.menubox import MenuBox
 from sheets.separators import VerticalSeparator
 from frames.commands import find_command
+from controls.optionsource import option_source
 
 # +---------------+
 # | Option 1    ↓ |
@@ -49,7 +50,8 @@ class OptionBox(Sheet):
                  options=None):
         super().__init__()
 
-        self._options = [] if options is None else options
+        # list or OptionSource
+        self._options = option_source(options)
         self._children = []
         self._label = Label(OptionBox.default_text, align="center")
         self.add_child(self._label)
@@ -72,7 +74,8 @@ class OptionBox(Sheet):
         return value if value != OptionBox.default_text else None
 
     def set_options(self, options):
-        self._options = options
+        self._options = option_source(options)
+        self.invalidate_layout()
         self.invalidate()
 
     def layout(self):
@@ -81,8 +84,11 @@ class OptionBox(Sheet):
         w = right-left
         self._drop_label.move_to(Point(w-3, 0))
 
+    def command_table(self):
+        return "optionbox"
+
     def handle_key_event(self, kevent):
-        command = find_command(kevent, command_table="optionbox")
+        command = find_command(kevent, command_table=self.command_table())
         if command is not None:
             return command.apply(self)
         return False
@@ -114,7 +120,7 @@ class OptionBox(Sheet):
         self._has_open_popup = True
 
     def menu_click_callback(self, button):
-        self._label._label_text = button._label._label_text
+        self._label.set_label_text(button._label._label_text)
         button.frame().menu_quit()
         self.frame().set_focus(self)
 
@@ -197,7 +203,7 @@ class OptionBox(Sheet):
         self._label.allocate_space(Region(l, t, r-3, b))
         self._drop_label.allocate_space(Region(l, t, l+2, t+1))
 
-    def compose_space(self):
+    def _compose_space(self):
         label_sr = self._label.compose_space()
         # +2 is for the |v| "button", +1 is for drop shadow
         return SpaceReq(label_sr.x_min()+2+1, label_sr.x_preferred()+2+1, FILL,
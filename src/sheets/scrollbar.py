@@ -138,7 +138,7 @@ class Scrollbar(Sheet):
                 # draw up to other button
                 self.draw_to(Point(0, 1+self._slug_offset+self._slug_size), slug, pen)
 
-    def compose_space(self):
+    def _compose_space(self):
         absolute_min = 2
         preferred = FILL
         max = FILL
@@ -235,15 +235,21 @@ class Scrollbar(Sheet):
         # position slug in scrollbar
         transform = scrolled_sheet._transform
         viewport_offset = transform._dy if self._orientation == "vertical" else transform._dx
-        offset_ratio = abs(viewport_offset) / self._scrolled_sheet_extent
+        self.set_scroll_offset(abs(viewport_offset))
+
+    def set_scroll_offset(self, offset):
+        # position slug in scrollbar; offset is how far (in lines or
+        # columns) the start of the visible part is from the start of
+        # the scrolled content
+        offset_ratio = offset / self._scrolled_sheet_extent
         bar_size = self._trough_size()
         self._slug_offset = math.ceil(bar_size * offset_ratio)
 
         # ensure offset < bar size
         self._slug_offset = min(self._slug_offset, bar_size-1)
 
-        logger.debug("viewport_offset=%s, viewport_extent=%s, sheet_extent=%s, offset_ratio=%s, bar_size=%s, slug_size=%s, slug_offset=%s",
-                     viewport_offset,
+        logger.debug("offset=%s, viewport_extent=%s, sheet_extent=%s, offset_ratio=%s, bar_size=%s, slug_size=%s, slug_offset=%s",
+                     offset,
                      self._viewport_extent,
                      self._scrolled_sheet_extent,
                      offset_ratio,
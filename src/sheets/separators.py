@@ -73,7 +73,7 @@ class HorizontalSeparator(Separator):
         self.draw_to(Point(r, y), HorizontalSeparator._line_chars[self._style], pen)
 
     # layout
-    def compose_space(self):
+    def _compose_space(self):
         length = FILL if self._size is None else self._size
         return SpaceReq(1, length, FILL, 1, 1, FILL)
 
@@ -100,6 +100,6 @@ class VerticalSeparator(Separator):
         self.draw_to(Point(x, h), VerticalSeparator._line_chars[self._style], pen)
 
     # layout
-    def compose_space(self):
+    def _compose_space(self):
         length = FILL if self._size is None else self._size
         return SpaceReq(1, 1, FILL, 1, length, FILL)
@@ -17,15 +17,30 @@
 from asciimatics.event import MouseEvent
 
 from geometry.transforms import Transform, IDENTITY_TRANSFORM
+from geometry.transforms import geometry_version, note_geometry_changed
 from geometry.regions import Region
 from geometry.points import Point
 from sheets.spacereq import FILL, SpaceReq
-from dcs.ink import Pen
+from dcs.ink import Pen, pen_version, note_pens_changed
+from frames.stats import recording_stats
 
 from logging import getLogger
 
 logger = getLogger(__name__)
 
+# Bumped whenever children are added to or removed from a sheet, or
+# sheets are attached / detached. Anything derived from the shape of
+# the sheet tree (e.g. focus order indexes) is out of date when this
+# changes.
+_tree_version = 0
+
+def tree_version():
+    return _tree_version
+
+def note_tree_changed():
+    global _tree_version
+    _tree_version += 1
+
 # ALL sheets are "drawing sheets". ALL sheets have children. ALL
 # sheets participate in layout.
 class Sheet():
@@ -50,6 +65,10 @@ class Sheet():
         self._children = []
         self._parent = None
         self._pens = None
+        # (role, state, pen) -> (pen, None) or (None, delegate); see
+        # "pen"
+        self._pen_cache = dict()
+        self._pen_cache_version = pen_version()
         self._region = None
         self._transform = IDENTITY_TRANSFORM
         # specify owner to deal with focus / events. By default this
@@ -60,6 +79,18 @@ class Sheet():
         # explicit width+height
         self._width = width
         self._height = height
+        # memoised space requirement; recalculated by "compose_space"
+        # when the sheet needs relayout
+        self._space_req = None
+        self._needs_relayout = True
+        # screen transform, drawing target and screen clip; derived
+        # from the positions of the sheet and its ancestors so
+        # recalculated when the geometry version changes. See
+        # "_update_screen_geometry"
+        self._screen_geometry_version = None
+        self._screen_transform = None
+        self._drawing_target = None
+        self._screen_clip = None
 
         self.on_detached_callback = None
 
@@ -79,15 +110,42 @@ class Sheet():
     # Delegate to top-level-sheet for colourscheme if nothing
     # specified
     def pen(self, role="undefined", state="default", pen="pen"):
-        if self._pens is None:
-            return self._parent.pen(role=role, state=state, pen=pen)
+        # Lookups are cached. A cached entry is either the pen itself
+        # or the nearest ancestor that overrides "pen"; those
+        # ancestors choose pens based on their current state (focus,
+        # pressed, etc.) so they have to be asked each time.
+        stats = recording_stats()
+        if stats is not None:
+            stats.note_pen_lookup()
+        if self._pen_cache_version != pen_version():
+            self._pen_cache = dict()
+            self._pen_cache_version = pen_version()
+        key = (role, state, pen)
+        entry = self._pen_cache.get(key)
+        if entry is None:
+            entry = self._find_pen(role, state, pen)
+            self._pen_cache[key] = entry
+        (found, delegate) = entry
+        if found is not None:
+            return found
+        return delegate.pen(role=role, state=state, pen=pen)
+
+    def _find_pen(self, role, state, pen):
         # default method looks for requested pen but if it can't find
         # it it passes the query to its parent.
-        if role in self._pens:
-            if state in self._pens[role]:
-                if pen in self._pens[role][state]:
-                    return self._pens[role][state][pen]
-        return self._parent.pen(role=role, state=state, pen=pen)
+        sheet = self
+        while True:
+            pens = sheet._pens
+            if pens is not None:
+                if role in pens:
+                    if state in pens[role]:
+                        if pen in pens[role][state]:
+                            return (pens[role][state][pen], None)
+            sheet = sheet._parent
+            # parents that don't override "pen" do nothing but look
+            # in their own pens so can be searched directly
+            if type(sheet).pen is not Sheet.pen:
+                return (None, sheet)
 
     # FIXME: this is a pretty horrible way to set colours for a
     # sheet. It works but is low level. Find a better interface for
@@ -100,6 +158,7 @@ class Sheet():
         if not state in self._pens[role]:
             self._pens[role][state] = dict()
         self._pens[role][state][which] = pen
+        note_pens_changed()
 
     # drawing
     def clear(self, region_ltrb, pen=None):
@@ -122,8 +181,11 @@ class Sheet():
         # of its children pass "undefined" for the role?
         if pen is None:
             pen = self.pen()
-        transformed_ltrb = self._transform.transform_region(region_ltrb)
-        self._parent.clear(transformed_ltrb, pen)
+        # drawing goes straight to the nearest ancestor that does its
+        # own drawing, usually the top level sheet
+        (target, dx, dy) = self.drawing_target()
+        (l, t, r, b) = region_ltrb.ltrb()
+        target.clear(Region(l+dx, t+dy, r+dx, b+dy), pen)
 
     # drawing
     def display_at(self, coord, text, pen):
@@ -131,13 +193,13 @@ class Sheet():
         # invoke print_at on t-l-s. Has to be better than expecting
         # every sheet in the hierarchy to implement the drawing
         # methods... or maybe not. Hrm.
-        parent_coord = self._transform.transform_point(coord)
-        self._parent.display_at(parent_coord, text, pen)
+        (target, dx, dy) = self.drawing_target()
+        target.display_at(Point(coord._x+dx, coord._y+dy), text, pen)
 
     # drawing
     def move(self, coord):
-        parent_coord = self._transform.transform_point(coord)
-        self._parent.move(parent_coord)
+        (target, dx, dy) = self.drawing_target()
+        target.move(Point(coord._x+dx, coord._y+dy))
 
     # drawing
     # if multiple chars are provided, only the first
@@ -147,30 +209,73 @@ class Sheet():
     # Not sure if only true when drawing ltr or ttb,
     # might not occur for rtl / btt.
     def draw_to(self, coord, char, pen):
-        parent_coord = self._transform.transform_point(coord)
-        self._parent.draw_to(parent_coord, char, pen)
+        (target, dx, dy) = self.drawing_target()
+        target.draw_to(Point(coord._x+dx, coord._y+dy), char, pen)
+
+    # drawing
+    def drawing_target(self):
+        """
+        Return (sheet, dx, dy) where sheet is the nearest ancestor
+        that implements its own drawing methods and dx, dy converts
+        this sheet's coordinates to that sheet's coordinates.
+        """
+        if self._screen_geometry_version != geometry_version():
+            self._update_screen_geometry()
+        return self._drawing_target
 
     # screenpos
     def move_to(self, coord):
         # this moves the child relative to its parent; coord is in
         # parent's coordinate space
-        self._transform = Transform(coord.point_x(), coord.point_y())
+        (x, y) = coord.xy()
+        if x != self._transform._dx or y != self._transform._dy:
+            self._note_hit_damage()
+            self._transform = Transform(x, y)
+            note_geometry_changed()
+            self._note_hit_damage()
+
+    def _note_hit_damage(self):
+        # tell the top level the cells the sheet covers need indexing
+        # again for "sheet_at"; called before and after it changes
+        if self._attached:
+            clip = self.screen_clip()
+            if clip is not None:
+                self.top_level_sheet().note_hit_damage(clip)
 
     # drawing / redisplay
     def render(self):
+        self.render_children()
+
+    # drawing / redisplay
+    def render_children(self):
+        # when the frame is only repairing part of the screen, skip
+        # children that lie entirely outside the area being repaired
+        clip = self.frame()._compositor.clip()
         for child in self._children:
+            if clip is not None and child._region is not None:
+                screen_clip = child.screen_clip()
+                if screen_clip is None or screen_clip.region_intersection(clip) is None:
+                    continue
             child.render()
 
     # genealogy
     def add_child(self, child):
         self._children.append(child)
         child._parent = self
+        # cached pen lookups follow the parent chain
+        note_pens_changed()
+        note_tree_changed()
+        self.invalidate_layout()
         if self.is_attached():
             child.attach()
 
     # genealogy
     def set_children(self, children):
         self._children = children
+        # cached pen lookups follow the parent chain
+        note_pens_changed()
+        note_tree_changed()
+        self.invalidate_layout()
         for child in children:
             child._parent = self
             if self.is_attached():
@@ -219,10 +324,51 @@ class Sheet():
                      log_indent, self, coord)
         return None
 
+    # hit testing
+    def hit_region(self):
+        """Return the part of the sheet's region that receives mouse
+        events, in the sheet's coordinates, or None."""
+        return self._region
+
+    # hit testing
+    def hit_children(self):
+        """Return the children that can receive mouse events, lowest
+        in the z-order first."""
+        return self._children
+
     def get_screen_transform(self):
-        # navigate parents until get to top level sheet composing
-        # transforms all the way up
-        return self._transform.add_transform(self._parent.get_screen_transform())
+        # composed from the transforms of the sheet and its parents
+        # when the sheet or an ancestor moves
+        if self._screen_geometry_version != geometry_version():
+            self._update_screen_geometry()
+        return self._screen_transform
+
+    def screen_clip(self):
+        """
+        Return the part of the sheet's region that's inside all of its
+        ancestors' regions, in screen coordinates, or None if there
+        isn't any.
+        """
+        if self._screen_geometry_version != geometry_version():
+            self._update_screen_geometry()
+        return self._screen_clip
+
+    def _update_screen_geometry(self):
+        parent = self._parent
+        transform = self._transform
+        self._screen_transform = transform.add_transform(parent.get_screen_transform())
+        if _draws_itself(parent):
+            self._drawing_target = (parent, transform._dx, transform._dy)
+        else:
+            (target, dx, dy) = parent.drawing_target()
+            self._drawing_target = (target, dx+transform._dx, dy+transform._dy)
+        parent_clip = parent.screen_clip()
+        if parent_clip is None or self._region is None:
+            self._screen_clip = None
+        else:
+            region = self._screen_transform.transform_region(self._region)
+            self._screen_clip = region.region_intersection(parent_clip)
+        self._screen_geometry_version = geometry_version()
 
     def delta_transform(self, target):
         # navigate parents until get to the target sheet, composing
@@ -255,7 +401,32 @@ class Sheet():
         containing the sheet.
 
         Returns a tuple of 2 tuples of (MINIMUM, DESIRED, MAXIUMUM)
+
+        The request is calculated by "_compose_space", which is what
+        sheet types override, and is remembered until the sheet is
+        marked as needing relayout.
+        """
+        if self._needs_relayout:
+            self._space_req = self._compose_space()
+            self._needs_relayout = False
+        return self._space_req
+
+    # layout
+    def content_extents(self):
         """
+        Return (width, height) of the area the sheet draws over when
+        it's scrolled by a Viewport, or None if the viewport has to
+        find out by watching the sheet draw.
+
+        Sheets that know their size without drawing everything, or
+        that only draw the part the viewport shows (see
+        "Viewport.exposed_content_region"), return it here and call
+        "Viewport.note_content_extents_changed" when it changes.
+        """
+        return None
+
+    # layout
+    def _compose_space(self):
         # basic 10x5 default
         spacereq = SpaceReq(10, FILL, FILL, 5, FILL, FILL)
         for child in self._children:
@@ -272,6 +443,64 @@ class Sheet():
 
         return SpaceReq(xmin, xpref, xmax, ymin, ypref, ymax)
 
+    # layout
+    def invalidate_layout(self):
+        """
+        Mark the sheet as needing relayout.
+
+        Call when something the sheet's space requirement depends on
+        changes. Ancestors' requirements depend on their children's
+        so they are marked too.
+        """
+        sheet = self
+        while sheet is not None:
+            sheet._needs_relayout = True
+            sheet = sheet._parent
+        # the frame lays out the affected part of the tree before the
+        # next redraw
+        if self.is_attached():
+            self.frame().invalidate_layout(self)
+
+    # layout
+    def relayout(self):
+        """
+        Lay out again the part of the sheet tree affected by changes
+        to this sheet's space requirement.
+
+        Walks up the tree until a sheet is found whose space
+        requirement has not changed; that sheet's allocation won't
+        change either, so only its children need new allocations and
+        layout. Returns the sheet that was laid out.
+        """
+        sheet = self
+        while sheet._parent is not None:
+            previous = sheet._space_req
+            if previous is not None and sheet.compose_space() == previous:
+                break
+            sheet = sheet._parent
+        if sheet._region is None:
+            # never been laid out; nothing to update
+            return None
+        sheet.compose_space()
+        sheet.allocate_space(sheet._region)
+        sheet.layout()
+        note_geometry_changed()
+        sheet._note_hit_damage()
+        if sheet.is_attached():
+            sheet.invalidate()
+        return sheet
+
+    # layout
+    def needs_relayout(self):
+        return self._needs_relayout
+
+    # layout
+    def set_fixed_size(self, width=None, height=None):
+        # None = size is not fixed in that direction
+        self._width = width
+        self._height = height
+        self.invalidate_layout()
+
     # layout
     def layout(self):
         """
@@ -311,6 +540,14 @@ class Sheet():
             return self
         return None
 
+    def focus_children(self):
+        """Return the children searched for focus candidates.
+
+        Controls that take the focus on behalf of their children
+        return an empty list.
+        """
+        return self._children
+
     def find_next_focus(self, current_focus, found_current=False):
         """Find next widget in tab order.
 
@@ -445,6 +682,15 @@ class Sheet():
             self._pressed = False
 
     # events
+    def command_table(self):
+        """Return the name of the command table holding this sheet's
+        key bindings, or None if it has none.
+
+        The frame looks for multi-key commands in the tables of the
+        focus and its parents; see "frames.commands".
+        """
+        return None
+
     def handle_key_event(self, event):
         # No handler by default
         return False
@@ -458,7 +704,7 @@ class Sheet():
         # just returns None.
         # Sheets that want to do something with the event need to provide
         # their own overrides for this method.
-        (px, py) = self._transform.transform_point(Point(event.x, event.y)).xy()
+        (px, py) = self._transform.transform_xy(event.x, event.y)
         self._parent.handle_event(MouseEvent(px, py, event.buttons))
 
     def invalidate(self):
@@ -467,6 +713,24 @@ class Sheet():
         # be redrawn on the next iteration of the event loop
         self.frame().invalidate(self)
 
+    def note_descendant_invalidated(self, sheet):
+        # the frame invokes this when sheet, a descendant, is
+        # invalidated but is going to be redrawn as part of this sheet
+        # or one of its ancestors. Sheets that keep their children's
+        # drawing instead of rendering them, e.g. viewports with a
+        # backing store, need to render sheet again.
+        pass
+
+    def invalidate_region(self, region=None):
+        # Mark a rectangle of this sheet, in the sheet's coordinate
+        # system, as damaged. Whatever is visible in that part of the
+        # screen will be redrawn on the next iteration of the event
+        # loop. Defaults to the whole sheet.
+        if region is None:
+            region = self._region
+        transform = self.get_screen_transform()
+        self.frame().invalidate_region(transform.transform_region(region))
+
     # attached / detached = linked to frame, available to be
     # displayed
     def is_detached(self):
@@ -477,13 +741,19 @@ class Sheet():
         # order. Ditto for "attach()"
         for child in reversed(self._children):
             child.detach()
+        self._note_hit_damage()
         self._attached = False
+        note_geometry_changed()
+        note_tree_changed()
         if self.on_detached_callback is not None:
             return self.on_detached_callback(self)
 
     def attach(self):
         # attach from bottom up
         self._attached = True
+        note_geometry_changed()
+        note_tree_changed()
+        self._note_hit_damage()
         for child in self._children:
             child.attach()
 
@@ -495,3 +765,16 @@ class Sheet():
             if found is not None:
                 return found
         return None
+
+
+# sheet type -> True if the type implements its own drawing methods
+_draws_itself_cache = dict()
+
+def _draws_itself(sheet):
+    sheet_type = type(sheet)
+    draws_itself = _draws_itself_cache.get(sheet_type)
+    if draws_itself is None:
+        draws_itself = any(getattr(sheet_type, method) is not getattr(Sheet, method)
+                           for method in ["clear", "display_at", "move", "draw_to"])
+        _draws_itself_cache[sheet_type] = draws_itself
+    return draws_itself
@@ -36,6 +36,12 @@ class SpaceReq():
             self.y_preferred() if self.y_preferred() < FILL else "FILL",
             self.y_max() if self.y_max() < FILL else "FILL")
 
+    def __eq__(self, other):
+        if not isinstance(other, SpaceReq):
+            return NotImplemented
+        return (self._xmin, self._xpref, self._xmax, self._ymin, self._ypref, self._ymax) \
+            == (other._xmin, other._xpref, other._xmax, other._ymin, other._ypref, other._ymax)
+
     def x_max(self):
         return self._xmax
 
@@ -35,6 +35,7 @@ from dcs.ink import Pen
 
 from frames.commands import find_command
 from sheets.textentry import TextEntry
+from dcs.textbuffer import TextBuffer, RopeBuffer
 
 from logging import getLogger
 
@@ -42,17 +43,24 @@ logger = getLogger(__name__)
 
 # This is a TextEntry subtype
 class TextArea(TextEntry):
-    """Text area widget."""
+    """Text area widget.
 
-    def __init__(self, text=[], lines=10):
+    text is a list of lines, a string, or a TextBuffer. Lists and
+    strings are copied into a RopeBuffer.
+    """
+
+    def __init__(self, text=None, lines=10):
         super().__init__()
         self._children = []
 #        border = BorderLayout(title=title)
 #        self.add_child(border)
-        # lines are a ordered list of lines
-        self._lines = text
-        if len(self._lines) == 0:
-            self._lines.append("")
+        if text is None:
+            text = ""
+        if not isinstance(text, TextBuffer):
+            if not isinstance(text, str):
+                text = "\n".join(text)
+            text = RopeBuffer(text)
+        self._buffer = text
         # How many lines to display in the text area
         self._visible_lines = lines
         # insertion point = where in the text the cursor is
@@ -79,7 +87,13 @@ class TextArea(TextEntry):
         self._text_selection=None
         self._vertical_text_selection=None
 
-    def compose_space(self):
+    def buffer(self):
+        return self._buffer
+
+    def _current_line(self):
+        return self._buffer.line(self._insertion_line)
+
+    def _compose_space(self):
         # arbitrary: assume 20xlines edit field by default
         return SpaceReq(10, 20, FILL, 1, self._visible_lines, FILL)
 
@@ -106,7 +120,7 @@ class TextArea(TextEntry):
         # text offset             |
         #         |<  self.width >|
         #
-        # _insertion_line = index into self._lines of the line
+        # _insertion_line = index into the buffer of the line
         # containing the cursor
         #
         # _insertion_point = index into line where cursor is
@@ -114,16 +128,17 @@ class TextArea(TextEntry):
         #
         # _text_offset = start of visible portion of line
         #
-        # _text_line = index into self._lines of the line that is
+        # _text_line = index into the buffer of the line that is
         # displayed first in the text area, i.e., the line at the top
         # of the text area visual.
         #
         # Do this calculation for each line
         for line in range(self._text_line, self._text_line + self.height()):
-            if line >= len(self._lines):
+            if line >= self._buffer.line_count():
                 break
-            display_text = self._lines[line]
-            display_text = display_text[self._text_offset:self._text_offset+self.width()]
+            # only the visible part of the line is fetched
+            display_text = self._buffer.line_text(line, self._text_offset,
+                                                  self._text_offset+self.width())
 
             # if line is in selected region, draw any selected text in
             # the selection colour instead of in the default colour.
@@ -155,17 +170,17 @@ class TextArea(TextEntry):
 
         # draw cursor if focus
         if self.is_focus():
-            line = self._lines[self._insertion_line]
+            line_length = self._buffer.line_length(self._insertion_line)
             # adjust x cursor point if insertion_point>line length;
             # cursor is drawn at end of line, but don't adjust
             # insertion point in case continue navigating up/down.
-            cursor_pos = min(self._insertion_point, len(line))
+            cursor_pos = min(self._insertion_point, line_length)
             insertion_pt_x = cursor_pos-self._text_offset
             insertion_pt_y = self._insertion_line-self._text_line
             # draw character under cursor or space for cursor using an
             # inverted pen
-            cursor = line[cursor_pos] \
-                if cursor_pos < len(line) \
+            cursor = self._buffer.line_text(self._insertion_line, cursor_pos, cursor_pos+1) \
+                if cursor_pos < line_length \
                    else ' '
             cursor_pen = self.pen(role="editable", state="focus", pen="cursor")
             self.display_at(Point(insertion_pt_x, insertion_pt_y), cursor, cursor_pen)
@@ -173,8 +188,11 @@ class TextArea(TextEntry):
     # events - top level sheets don't pass event on to a parent,
     # instead they return False to indicate the event is not handled
     # and expect the Frame to take any further necessary action
+    def command_table(self):
+        return "textarea"
+
     def handle_key_event(self, key_event):
-        command = find_command(key_event, command_table="textarea")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             result = command.apply(self)
             self.invalidate()
@@ -195,12 +213,11 @@ class TextArea(TextEntry):
         # CTRL+KEY_UP (up paragraph)
         # CTRL+KEY_DOWN (down paragraph)
 
-        line = self._lines[self._insertion_line]
-        # adjust pos if insertion point > line length. This happens
-        # from up/down motion to lines shorter than the original line
-        pos = min(self._insertion_point, len(line))
-        line = line[:pos] + chr(key_event.key_code) + line[pos:]
-        self._lines[self._insertion_line] = line
+        # buffer adjusts pos if insertion point > line length. This
+        # happens from up/down motion to lines shorter than the
+        # original line
+        self._buffer.insert(self._insertion_line, self._insertion_point,
+                            chr(key_event.key_code))
         self.move_forward()
         self.invalidate()
         return True
@@ -214,22 +231,22 @@ class TextArea(TextEntry):
 
     # fixme: could super method if there was a current line accessor
     def _move_end_1(self):
-        line = self._lines[self._insertion_line]
-        self._insertion_point = len(line)
-        self._text_offset = max(len(line)-self.width()+1, 0)
+        line_length = self._buffer.line_length(self._insertion_line)
+        self._insertion_point = line_length
+        self._text_offset = max(line_length-self.width()+1, 0)
 
     # def move_forward(self):
 
     # fixme: could super method if there was a current line accessor
     def _move_forward_1(self):
-        line = self._lines[self._insertion_line]
-        self._insertion_point = min(self._insertion_point+1, len(line))
+        line_length = self._buffer.line_length(self._insertion_line)
+        self._insertion_point = min(self._insertion_point+1, line_length)
         if self._insertion_point-self._text_offset >= self.width():
             self._text_offset += 1
 
     def _move_forward_word_1(self):
         start = self.skip_start_ws()
-        text = self._lines[self._insertion_line]
+        text = self._current_line()
         for index in range(start, len(text)):
             if not text[index].isalnum():
                 # found the space
@@ -242,7 +259,7 @@ class TextArea(TextEntry):
             self._text_offset = self._insertion_point-self.width()+1
 
     def skip_start_ws(self):
-        text = self._lines[self._insertion_line]
+        text = self._current_line()
         index = self._insertion_point
         while index < len(text)-1 and not text[index].isalnum():
             index += 1
@@ -252,7 +269,7 @@ class TextArea(TextEntry):
         # move index back 1 so it points between words instead of
         # at the start of the word we want to move off (if
         # repeated "back word" commands are received)
-        text = self._lines[self._insertion_line]
+        text = self._current_line()
         index = min(self._insertion_point-1, len(text)-1)
         while index > 0 and not text[index].isalnum():
             index -= 1
@@ -265,7 +282,7 @@ class TextArea(TextEntry):
 
     # fixme: could super method if there was a current line accessor
     def _move_backward_word_1(self):
-        text = self._lines[self._insertion_line]
+        text = self._current_line()
         start = self.skip_end_ws()
         while text[start].isalnum() and start > 0:
             start -= 1
@@ -312,7 +329,7 @@ class TextArea(TextEntry):
 
     def _move_down_1(self):
         # vertical movement does not affect the insertion point
-        self._insertion_line = min(self._insertion_line+1, len(self._lines)-1)
+        self._insertion_line = min(self._insertion_line+1, self._buffer.line_count()-1)
         if self._insertion_line-self._text_line >= self.height():
             self._text_line += 1
 
@@ -327,13 +344,14 @@ class TextArea(TextEntry):
         # vertical movement does not affect the insertion point;
         # Cursor ends up at bottom of screen
         page_size = self.height()-1
-        self._insertion_line = min(self._insertion_line+page_size, len(self._lines)-1)
+        self._insertion_line = min(self._insertion_line+page_size, self._buffer.line_count()-1)
         if self._insertion_line-self._text_line >= self.height():
             self._text_line = self._insertion_line-page_size
         return True
 
     def open_below(self):
-        self._lines.insert(self._insertion_line+1, "")
+        line_length = self._buffer.line_length(self._insertion_line)
+        self._buffer.insert(self._insertion_line, line_length, "\n")
         self.move_down()
         self.move_start()
         self.reset_selection()  # fixme: move to a more generic call site to avoid duplication
@@ -341,25 +359,23 @@ class TextArea(TextEntry):
 
     def delete(self):
         # delete text selection or character to right of insertion point
-        text = self._lines[self._insertion_line]
         if self._text_selection is not None:
             (start, end) = self._text_selection
             self._update_text_for_cut_or_paste(start, end, "")
-        if self._insertion_point < len(text):
-            text = text[:self._insertion_point] + text[self._insertion_point+1:]
-            self._lines[self._insertion_line] = text
+        elif self._insertion_point < self._buffer.line_length(self._insertion_line):
+            self._buffer.delete(self._insertion_line, self._insertion_point,
+                                self._insertion_line, self._insertion_point+1)
         self.reset_selection()  # fixme: move to a more generic call site to avoid duplication
         return True
 
     def backspace(self):
         # delete text selection or character to left of insertion point
-        text = self._lines[self._insertion_line]
         if self._text_selection is not None:
             (start, end) = self._text_selection
             self._update_text_for_cut_or_paste(start, end, "")
-        if self._insertion_point > 0:
-            text = text[:self._insertion_point-1] + text[self._insertion_point:]
-            self._lines[self._insertion_line] = text
+        elif self._insertion_point > 0:
+            self._buffer.delete(self._insertion_line, self._insertion_point-1,
+                                self._insertion_line, self._insertion_point)
             self.move_backward()
         self.reset_selection()  # fixme: move to a more generic call site to avoid duplication
         return True
@@ -408,7 +424,7 @@ class TextArea(TextEntry):
         # put text covered by selection on the system clipboard
         if self._text_selection is not None:
             (start, end) = self._text_selection
-            text = self._lines[self._insertion_line][start:end]
+            text = self._buffer.line_text(self._insertion_line, start, end)
             pyperclip.copy(text)
             self.reset_selection()
             return True
@@ -419,7 +435,7 @@ class TextArea(TextEntry):
         # clipboard and remove the text from the entry
         if self._text_selection is not None:
             (start, end) = self._text_selection
-            text = self._lines[self._insertion_line][start:end]
+            text = self._buffer.line_text(self._insertion_line, start, end)
             pyperclip.copy(text)
 
             self._update_text_for_cut_or_paste(start, end, "")
@@ -430,13 +446,14 @@ class TextArea(TextEntry):
     # fixme: what about cutting out a rectangle? this method needs to
     # be way cleverer...
     def _update_text_for_cut_or_paste(self, start, end, text):
-        _text = self._lines[self._insertion_line]
-        pre=_text[:start]
-        post=_text[end:]
-        self._lines[self._insertion_line]=pre+text+post
+        line = self._insertion_line
+        self._buffer.delete(line, start, line, end)
+        # text can contain newlines if it's pasted
+        (self._insertion_line, self._insertion_point) = self._buffer.insert(line, start, text)
+        if self._insertion_line-self._text_line >= self.height():
+            self._text_line = self._insertion_line-self.height()+1
         # insertion point needs to be at the end of "text" and
         # on-screen
-        self._insertion_point=start+len(text)
         if self._insertion_point >= self.width():
             self._text_offset=self._insertion_point-self.width()+1
         # if deleting a selection the insertion point can end up off
@@ -78,7 +78,7 @@ class TextEntry(Sheet, ValueMixin):
     def accepts_focus(self):
         return True
 
-    def compose_space(self):
+    def _compose_space(self):
         # arbitrary: assume 20x1 edit field by default
         return SpaceReq(10, 20, FILL, 1, 1, FILL)
 
@@ -139,8 +139,11 @@ class TextEntry(Sheet, ValueMixin):
     # events - top level sheets don't pass event on to a parent,
     # instead they return False to indicate the event is not handled
     # and expect the Frame to take any further necessary action
+    def command_table(self):
+        return "textentry"
+
     def handle_key_event(self, key_event):
-        command = find_command(key_event, command_table="textentry")
+        command = find_command(key_event, command_table=self.command_table())
         if command is not None:
             result = command.apply(self)
             self.invalidate()
@@ -17,6 +17,8 @@
 from sheets.sheet import Sheet
 from dcs.ink import Pen
 from geometry.points import Point
+from frames.hitindex import HitIndex
+from frames.focusindex import FocusIndex
 
 from logging import getLogger
 
@@ -26,8 +28,13 @@ class TopLevelSheet(Sheet):
 
     def __init__(self):
         super().__init__()
+        # accelerator registry; kept in step by the frame's
+        # "register_accelerator" and "discard_accelerator"
         self._accelerator_to_widget = dict()
+        self._widget_to_accelerator = dict()
         self._frame = None
+        self._hit_index = HitIndex(self)
+        self._focus_index = FocusIndex(self)
 
     def __repr__(self):
         return "TopLevelSheet({}x{})".format(self.width(), self.height())
@@ -35,63 +42,58 @@ class TopLevelSheet(Sheet):
     def pen(self, role="undefined", state="default", pen="pen"):
         if role == "undefined":
             role = "toplevel"
-        # default method looks for requested pen but if it can't find
-        # it it passes the query to its parent.
-        spen = None
+        return super().pen(role=role, state=state, pen=pen)
+
+    def _find_pen(self, role, state, pen):
+        # look for requested pen and if it can't be found get it from
+        # the frame
         if self._pens is not None:
             if role in self._pens:
                 if state in self._pens[role]:
                     if pen in self._pens[role][state]:
-                        spen = self._pens[role][state][pen]
-        # If not found get from frame
-        if spen is None:
-            spen = self.frame().pen(role, state, pen)
-        return spen
+                        return (self._pens[role][state][pen], None)
+        if self.is_detached():
+            raise RuntimeError("Sheet {} not attached".format(self))
+        return (None, self.frame())
 
+    # drawing is done into the frame's compositor; changed cells are
+    # sent to the screen when the frame is refreshed.
     def clear(self, region_ltrb, pen):
         # top level transform = top level -> "screen"
-        transformed_region = self._transform.transform_region(region_ltrb)
-        (l, t, r, b) = transformed_region.ltrb()
-        # Python range() does not include the upper bound
-        for line in range(t, b):
-            self._frame._screen.move(l, line)
-            self._frame._screen.draw(r, line, pen.fill(), colour=pen.fg(), bg=pen.bg())
+        (l, t, r, b) = self._transform.transform_ltrb(*region_ltrb.ltrb())
+        # asciimatics' draw() used to do the fill and it always drew
+        # with attribute 0; retain that.
+        self._frame._compositor.fill(l, t, r, b, pen.fill(), pen.fg(), 0, pen.bg())
+        if self._frame._stats is not None:
+            self._frame._stats.note_draw(max(r-l, 0) * max(b-t, 0))
 
     def display_at(self, coord, text, pen):
-        (x, y) = self._transform.transform_point(coord).xy()
-        self._frame._screen.print_at(text, x, y, colour=pen.fg(), attr=pen.attr(), bg=pen.bg())
+        (x, y) = self._transform.transform_xy(coord._x, coord._y)
+        self._frame._compositor.print_at(text, x, y, pen.fg(), pen.attr(), pen.bg())
+        if self._frame._stats is not None:
+            self._frame._stats.note_draw(len(text))
 
     def move(self, coord):
-        point = self._transform.transform_point(coord)
-        self._frame._screen.move(point.point_x(), point.point_y())
+        (x, y) = self._transform.transform_xy(coord._x, coord._y)
+        self._frame._compositor.move(x, y)
 
     def draw_to(self, coord, char, pen):
         if len(char) > 1:
             raise RuntimeError("draw_to accepts single drawing char", char)
-        (x, y) = self._transform.transform_point(coord).xy()
-        # Asciimatic's screen x/y are double the "character
-        # positions". Make allowances.
-        (from_x, from_y) = (self._frame._screen._x, self._frame._screen._y)
-        from_x = from_x // 2
-        from_y = from_y // 2
-
-        # only draw straight lines
+        (x, y) = self._transform.transform_xy(coord._x, coord._y)
+        compositor = self._frame._compositor
+        (from_x, from_y) = compositor.cursor()
+        if self._frame._stats is not None:
+            self._frame._stats.note_draw(max(abs(x-from_x), abs(y-from_y)))
+
+        # only draw straight lines; the end point is excluded. Each
+        # line is a single write to the compositor.
         if x == from_x:
-            # vertical
-            min_y = min(from_y, y)
-            max_y = max(from_y, y)
-            # upper end of range is excluded
-            for y in range(min_y, max_y):
-                self._frame._screen.print_at(char, x, y, colour=pen.fg(),
-                                             attr=pen.attr(), bg=pen.bg())
+            compositor.vertical_line(x, min(from_y, y), max(from_y, y),
+                                     char, pen.fg(), pen.attr(), pen.bg())
         else:
-            # horizontal
-            min_x = min(x, from_x)
-            max_x = max(x, from_x)
-            # upper end of range is excluded
-            for x in range(min_x, max_x):
-                self._frame._screen.print_at(char, x, y, colour=pen.fg(),
-                                             attr=pen.attr(), bg=pen.bg())
+            compositor.horizontal_line(min(x, from_x), max(x, from_x), y,
+                                       char, pen.fg(), pen.attr(), pen.bg())
 
     def add_child(self, child):
         if self._children:
@@ -110,6 +112,7 @@ class TopLevelSheet(Sheet):
     # in available space (or to overflow)?
     def allocate_space(self, allocation):
         self._region = allocation
+        self._hit_index.invalidate()
         for child in self._children:
             # child of top level sheet MAY NOT have a transform
             child.move_to(Point(0, 0))
@@ -122,6 +125,41 @@ class TopLevelSheet(Sheet):
     def get_screen_transform(self):
         return self._transform
 
+    def screen_clip(self):
+        if self._region is None:
+            return None
+        return self._transform.transform_region(self._region)
+
+    def drawing_target(self):
+        return (self, 0, 0)
+
+    def sheet_at(self, x, y):
+        """Return the sheet at screen position x, y and the transform
+        from screen coordinates to that sheet's coordinates.
+
+        Returns (None, None) if no sheet contains the position.
+        """
+        return self._hit_index.sheet_at(x, y)
+
+    def note_hit_damage(self, region):
+        self._hit_index.note_damage(region)
+
+    # focus; the focus index gives the same answers as walking the
+    # sheet tree from the top
+    def find_focus_candidate(self, from_end=False):
+        return self._focus_index.first_focus(from_end=from_end)
+
+    def find_next_focus(self, current_focus, found_current=False):
+        if found_current:
+            # part of a walk over a larger tree
+            return super().find_next_focus(current_focus, found_current)
+        return self._focus_index.next_focus(current_focus)
+
+    def find_prev_focus(self, current_focus, previous_candidate=None, indent="__"):
+        if previous_candidate is not None:
+            return super().find_prev_focus(current_focus, previous_candidate, indent)
+        return self._focus_index.prev_focus(current_focus)
+
     def handle_event(self, event):
         # False == not handled, not that anybody cares at this point
         return False
@@ -16,10 +16,11 @@
 
 from sheets.sheet import Sheet
 from sheets.spacereq import FILL
-from geometry.transforms import Transform
 from geometry.regions import Region
 from geometry.points import Point
 from sheets.dialog import alert
+from dcs.cellbuffer import CellBuffer
+from dcs.ink import Pen, pen_version
 
 from logging import getLogger
 
@@ -38,11 +39,22 @@ class Viewport(Sheet):
     # fixme: scrolled_sheet, or just use _children?
     # _scrolled_sheet = None
 
+    # With backing_store=True everything the scrolled sheet draws is
+    # also kept in an off-screen cell buffer covering the scrolled
+    # extents. Scrolling then copies the newly visible part of the
+    # buffer to the screen instead of rendering the scrolled sheet
+    # again. The scrolled sheet is only rendered into the buffer when
+    # the viewport is laid out, pens change, or the scrolled extents
+    # outgrow the buffer; drawing done when sheets inside the
+    # viewport are invalidated goes into the buffer as well as to the
+    # screen.
+
     def __init__(self,
                  contentpane,
                  vertical_bar=None,
                  horizontal_bar=None,
-                 owner=None):
+                 owner=None,
+                 backing_store=False):
         super().__init__(owner=owner)
         self._scrolled_sheet = contentpane
         self.add_child(contentpane)
@@ -53,6 +65,24 @@ class Viewport(Sheet):
         if self._horizontal_sb is not None:
             self._horizontal_sb._viewport = self
         self._scrolled_ltrb = (0, 0, 1, 1)
+        self._backing_store = backing_store
+        # CellBuffer in the scrolled sheet's coordinates, or None when
+        # the scrolled sheet needs rendering into a new one, and the
+        # pen version it was drawn with
+        self._backing = None
+        self._backing_pen_version = None
+        # True while the scrolled sheet is being rendered into the
+        # backing store; drawing isn't passed on to the screen
+        self._drawing_backing_store = False
+        # invalidated descendants to render into the backing store
+        # before it's next copied to the screen; see
+        # "note_descendant_invalidated"
+        self._stale_sheets = dict()
+        # drawing cursor in the backing store for "move" and "draw_to"
+        self._backing_cursor = (0, 0)
+        # True if the scrolled sheet reports its extents; otherwise
+        # they're found by watching it draw
+        self._reported_extents = False
 
     def __repr__(self):
         if self._region is None:
@@ -104,6 +134,7 @@ class Viewport(Sheet):
     # Give the child as much space as is available, 'cause why not?
     def allocate_space(self, allocation):
         self._region = allocation
+        self._backing = None
         # the scrolled sheet has no "allocation" per se, it just accepts
         # pretty much everything.
         # Only use FILL in directions that the sheet can scroll;
@@ -123,15 +154,166 @@ class Viewport(Sheet):
         for child in self._children:
             child.move_to(Point(0, 0))
             child.layout()
+        self._update_content_extents()
+
+    # Scrolled sheets can report their extents up front; see
+    # "Sheet.content_extents". Otherwise they're measured as the
+    # sheet draws and grow as more of it is seen.
+
+    def note_content_extents_changed(self):
+        """Update the scroll extents and scroll bars after the scrolled
+        sheet's "content_extents" changes."""
+        self._update_content_extents()
+        self._backing = None
+        self.invalidate()
+        for bar in [self._vertical_sb, self._horizontal_sb]:
+            if bar is not None:
+                bar.invalidate()
+
+    def exposed_content_region(self):
+        """Return the part of the scrolled sheet that needs drawing, in
+        the scrolled sheet's coordinates.
+
+        This is the part inside the viewport, or all of the scroll
+        extents if the viewport keeps a backing store. Sheets that
+        report their extents can draw only this region.
+        """
+        (_, _, r, b) = self._scrolled_ltrb
+        if self._backing_store:
+            return Region(0, 0, max(r, self.width()), max(b, self.height()))
+        trans = self._scrolled_sheet._transform
+        (l, t, r, b) = self._region.ltrb()
+        return Region(l-trans._dx, t-trans._dy, r-trans._dx, b-trans._dy)
+
+    def _update_content_extents(self):
+        extents = self._scrolled_sheet.content_extents()
+        self._reported_extents = extents is not None
+        if extents is None:
+            return
+        (width, height) = extents
+        self._scrolled_ltrb = (0, 0, max(width, 1), max(height, 1))
+        # keep the scrolled sheet inside the extents if they shrank
+        trans = self._scrolled_sheet._transform
+        (_, _, r, b) = self._scrolled_ltrb
+        x = min(0, max(trans._dx, self.width()-r))
+        y = min(0, max(trans._dy, self.height()-b))
+        if (x, y) != (trans._dx, trans._dy):
+            self._scrolled_sheet.move_to(Point(x, y))
+        if self._vertical_sb is not None and self._vertical_sb._region is not None:
+            self._vertical_sb.update_extents(self._scrolled_ltrb, self.height())
+            self._vertical_sb.update_scroll_offset(self._scrolled_sheet)
+        if self._horizontal_sb is not None and self._horizontal_sb._region is not None:
+            self._horizontal_sb.update_extents(self._scrolled_ltrb, self.width())
+            self._horizontal_sb.update_scroll_offset(self._scrolled_sheet)
 
     def render(self):
         if not self._region:
             raise RuntimeError("render invoked before space allocation")
+        if self._backing_store:
+            if self._backing is None or self._backing_pen_version != pen_version():
+                self._render_backing_store()
+            elif self._stale_sheets:
+                self._render_stale_sheets()
+            self._blit_backing_store()
+            return
         self.clear(self._region)
-        for child in self._children:
-            child.render()
+        self.render_children()
         # fixme: how to deal with events?
 
+    def invalidate_backing_store(self):
+        """Render the scrolled sheet into a new backing store when the
+        viewport is next rendered.
+
+        Only needed if the scrolled sheet is changed without being
+        redrawn, e.g. if it's laid out again.
+        """
+        self._backing = None
+        self.invalidate()
+
+    def note_descendant_invalidated(self, sheet):
+        # the frame won't render sheet itself since this viewport, or
+        # one of its ancestors, is waiting to be redrawn; the backing
+        # store has to be brought up to date before it's copied
+        if self._backing is not None:
+            self._stale_sheets[sheet] = None
+
+    def _render_stale_sheets(self):
+        # render the invalidated descendants into the backing store
+        # only; the visible part is copied to the screen afterwards
+        compositor = self.frame()._compositor
+        clip = compositor.clip()
+        compositor.set_clip(None)
+        self._drawing_backing_store = True
+        try:
+            for sheet in self._stale_sheets:
+                if sheet.is_attached():
+                    sheet.render()
+        finally:
+            self._stale_sheets = dict()
+            self._drawing_backing_store = False
+            compositor.set_clip(clip)
+
+    def _render_backing_store(self):
+        # render the whole scrolled sheet, including the parts
+        # outside the viewport, into a buffer big enough to hold the
+        # scroll extents and the visible area. If the extents grow
+        # while rendering the sheet is rendered again into a buffer
+        # that holds them.
+        compositor = self.frame()._compositor
+        clip = compositor.clip()
+        compositor.set_clip(None)
+        # the viewport background, as "render" clears it without the
+        # backing store
+        pen = self._parent.pen()
+        self._drawing_backing_store = True
+        # everything is drawn again
+        self._stale_sheets = dict()
+        try:
+            for _ in range(2):
+                (_, _, r, b) = self._scrolled_ltrb
+                width = max(r, self.width())
+                height = max(b, self.height())
+                self._backing = CellBuffer(width, height, pen.fg(), 0, pen.bg(), pen.fill())
+                self._backing_pen_version = pen_version()
+                self.render_children()
+                (_, _, r, b) = self._scrolled_ltrb
+                if r <= width and b <= height:
+                    break
+        finally:
+            self._drawing_backing_store = False
+            compositor.set_clip(clip)
+
+    def _blit_backing_store(self):
+        # copy the visible part of the backing store to the screen
+        backing = self._backing
+        (l, t, r, b) = self._region.ltrb()
+        trans = self._scrolled_sheet._transform
+        (dx, dy) = (trans._dx, trans._dy)
+        # visible area in the scrolled sheet's coordinates
+        (left, top, right, bottom) = (l-dx, t-dy, r-dx, b-dy)
+        if left < 0 or top < 0 or right > backing.width() or bottom > backing.height():
+            # scrolled sheet doesn't cover the viewport
+            self._clear_visible(self._region, None)
+        parent = self._parent
+        for y in range(max(top, 0), min(bottom, backing.height())):
+            for (x, text, fg, attr, bg) in backing.row_runs(y, left, right):
+                parent_coord = self._transform.transform_point(Point(x+dx, y+dy))
+                parent.display_at(parent_coord, text, _backing_pen(fg, attr, bg))
+
+    def _backing_xy(self, coord):
+        # coord in the viewport to the scrolled sheet's coordinates
+        trans = self._scrolled_sheet._transform
+        return (coord._x-trans._dx, coord._y-trans._dy)
+
+    def _note_backing_extents(self):
+        # drawing outside the backing store grew the scroll extents;
+        # the scrolled sheet needs rendering into a bigger buffer
+        if self._drawing_backing_store:
+            return
+        (_, _, r, b) = self._scrolled_ltrb
+        if r > self._backing.width() or b > self._backing.height():
+            self.invalidate_backing_store()
+
     def _clip_text(self, coord, text):
         # measure text, cut off any that would be rendered before x=0
         # + cut off any that would be rendered after 'width'
@@ -183,6 +365,16 @@ class Viewport(Sheet):
     def clear(self, region, pen=None):
         # Clip the region being cleared so it remains inside the
         # viewport
+        if self._backing is not None:
+            (x, y) = self._backing_xy(Point(region._left, region._top))
+            fill_pen = self._parent.pen() if pen is None else pen
+            self._backing.fill(x, y, x+region.region_width(), y+region.region_height(),
+                               fill_pen.fill(), fill_pen.fg(), 0, fill_pen.bg())
+            if self._drawing_backing_store:
+                return
+        self._clear_visible(region, pen)
+
+    def _clear_visible(self, region, pen):
         clipped_region = self._clip_region(region)
         if clipped_region is not None:
             transformed_region = self._transform.transform_region(clipped_region)
@@ -192,6 +384,12 @@ class Viewport(Sheet):
     def display_at(self, coord, text, pen):
         # capture full extents of print
         self._capture_print_at(text, coord)
+        if self._backing is not None:
+            (x, y) = self._backing_xy(coord)
+            self._backing.print_at(text, x, y, pen.fg(), pen.attr(), pen.bg())
+            if self._drawing_backing_store:
+                return
+            self._note_backing_extents()
         # clip to region prior to drawing
         text = self._clip_text(coord, text)
         if text != '':
@@ -203,6 +401,10 @@ class Viewport(Sheet):
     # drawing
     def move(self, coord):
         self._capture_move(coord)
+        if self._backing is not None:
+            self._backing_cursor = self._backing_xy(coord)
+            if self._drawing_backing_store:
+                return
         coord = self._clip(coord)
         if coord is not None:
             parent_coord = self._transform.transform_point(coord)
@@ -215,6 +417,19 @@ class Viewport(Sheet):
     # characters. Perhaps.
     def draw_to(self, coord, char, pen):
         self._capture_draw(coord, char)
+        if self._backing is not None:
+            (x, y) = self._backing_xy(coord)
+            (from_x, from_y) = self._backing_cursor
+            if x == from_x:
+                self._backing.vertical_line(x, min(from_y, y), max(from_y, y),
+                                            char, pen.fg(), pen.attr(), pen.bg())
+            else:
+                self._backing.horizontal_line(min(x, from_x), max(x, from_x), y,
+                                              char, pen.fg(), pen.attr(), pen.bg())
+            self._backing_cursor = (x, y)
+            if self._drawing_backing_store:
+                return
+            self._note_backing_extents()
         coord = self._clip(coord)
         if coord is not None:
             parent_coord = self._transform.transform_point(coord)
@@ -223,6 +438,8 @@ class Viewport(Sheet):
     def _capture_print_at(self, text, coord):
         # capture scroller extents in the coord system of the scrolled
         # sheet
+        if self._reported_extents:
+            return
         trans = self._scrolled_sheet._transform
         ccoord = trans.inverse().transform_point(coord)
         self.update_scroll_extents(ccoord)
@@ -239,11 +456,15 @@ class Viewport(Sheet):
         self.update_scroll_extents(Point(x + len(text)-1, y))
 
     def _capture_move(self, coord):
+        if self._reported_extents:
+            return
         trans = self._scrolled_sheet._transform
         ccoord = trans.inverse().transform_point(coord)
         self.update_scroll_extents(ccoord)
 
     def _capture_draw(self, coord, char):
+        if self._reported_extents:
+            return
         trans = self._scrolled_sheet._transform
         ccoord = trans.inverse().transform_point(coord)
         self.update_scroll_extents(coord)
@@ -316,7 +537,7 @@ class Viewport(Sheet):
         trans = self._scrolled_sheet._transform
         x = min(0, trans._dx+delta)
         # fixme: don't update transform if it doesn't change
-        self._scrolled_sheet._transform = Transform(x, trans._dy)
+        self._scrolled_sheet.move_to(Point(x, trans._dy))
         self._horizontal_sb.update_scroll_offset(self._scrolled_sheet)
         # invalidating the viewport will redraw the scrolled sheet
         # beneath it
@@ -338,7 +559,7 @@ class Viewport(Sheet):
         tmax = self.width() - sw
         x = max(tmax, trans._dx-delta)
         # fixme: don't update transform if it doesn't change
-        self._scrolled_sheet._transform = Transform(x, trans._dy)
+        self._scrolled_sheet.move_to(Point(x, trans._dy))
         self._horizontal_sb.update_scroll_offset(self._scrolled_sheet)
         self.invalidate()
 
@@ -359,7 +580,7 @@ class Viewport(Sheet):
     def scroll_up_lines(self, delta):
         trans = self._scrolled_sheet._transform
         y = min(0, trans._dy+delta)
-        self._scrolled_sheet._transform = Transform(trans._dx, y)
+        self._scrolled_sheet.move_to(Point(trans._dx, y))
         self._vertical_sb.update_scroll_offset(self._scrolled_sheet)
         self.invalidate()
 
@@ -377,6 +598,17 @@ class Viewport(Sheet):
         (sw, sh) = (r-l),(b-t)
         tmax = self.height() - sh
         y = max(tmax, trans._dy-delta)
-        self._scrolled_sheet._transform = Transform(trans._dx, y)
+        self._scrolled_sheet.move_to(Point(trans._dx, y))
         self._vertical_sb.update_scroll_offset(self._scrolled_sheet)
         self.invalidate()
+
+
+# pens for copying cells from backing stores to the screen
+_backing_pens = dict()
+
+def _backing_pen(fg, attr, bg):
+    pen = _backing_pens.get((fg, attr, bg))
+    if pen is None:
+        pen = Pen(fg, attr, bg)
+        _backing_pens[(fg, attr, bg)] = pen
+    return pen